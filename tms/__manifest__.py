@@ -5,7 +5,7 @@
 {
     "name": "Transportation Management System (TMS)",
     "summary": "Transportation Management System (TMS)",
-    "version": "15.0.1.0.0",
+    "version": "15.0.1.4.0",
     "category": "Logistic",
     "website": "https://github.com/OCA/tms",
     "author": "Tecnativa, " "Odoo Community Association (OCA)",
@@ -14,6 +14,7 @@
     "installable": True,
     "external_dependencies": {
         "python": [
+            "numpy",
             "stdnum",
         ],
     },
@@ -32,6 +33,7 @@
         "security/ir.model.access.csv",
         "security/tms_security.xml",
         "data/ir_sequence_data.xml",
+        "data/ir_cron_data.xml",
         "data/iso6346.length.csv",
         "data/iso6346.second.size.csv",
         "data/iso6346.type.csv",
@@ -50,7 +52,10 @@
         "views/purchase_views.xml",
         "views/tms_equipment_view.xml",
         "views/tms_menu_view.xml",
+        "views/tms_route_job_views.xml",
         "views/tms_package.xml",
+        "views/tms_package_state_log_views.xml",
+        "wizards/tms_package_import_views.xml",
     ],
     "assets": {
         "web.assets_backend": [
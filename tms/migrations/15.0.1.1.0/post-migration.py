@@ -0,0 +1,11 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+from openupgradelib import openupgrade
+
+
+@openupgrade.migrate()
+def migrate(env, version):
+    # Checkpoints and routes are processed by tms.route.job queue
+    automation = env.ref("tms.automation_fill_checkpoints", raise_if_not_found=False)
+    if automation:
+        automation.active = False
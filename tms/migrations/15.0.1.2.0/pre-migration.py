@@ -0,0 +1,64 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+from openupgradelib import openupgrade
+
+
+@openupgrade.migrate()
+def migrate(env, version):
+    # Create stored package totals columns and fill them with SQL to avoid
+    # computing them task by task
+    openupgrade.logged_query(
+        env.cr,
+        """
+        ALTER TABLE project_task
+            ADD COLUMN IF NOT EXISTS volume numeric,
+            ADD COLUMN IF NOT EXISTS weight numeric,
+            ADD COLUMN IF NOT EXISTS number_of_packages integer,
+            ADD COLUMN IF NOT EXISTS pallet_qty integer,
+            ADD COLUMN IF NOT EXISTS euro_pallet_qty integer
+        """,
+    )
+    openupgrade.logged_query(
+        env.cr,
+        """
+        UPDATE project_task
+        SET volume = 0.0, weight = 0.0, number_of_packages = 0, pallet_qty = 0,
+            euro_pallet_qty = 0
+        """,
+    )
+    openupgrade.logged_query(
+        env.cr,
+        """
+        WITH RECURSIVE tree(root_id, task_id) AS (
+            SELECT id, id FROM project_task
+            UNION
+            SELECT tree.root_id, child.id
+            FROM tree
+            JOIN project_task child ON child.parent_id = tree.task_id
+            WHERE child.active
+        ), totals AS (
+            SELECT task_package.root_id,
+                SUM(package.shipping_volume) AS volume,
+                SUM(package.shipping_weight) AS weight,
+                SUM(package.number_of_packages) AS number_of_packages,
+                SUM(package.pallet_qty) AS pallet_qty,
+                SUM(package.euro_pallet_qty) AS euro_pallet_qty
+            FROM (
+                SELECT DISTINCT tree.root_id, rel.tms_package_id
+                FROM tree
+                JOIN project_task_tms_package_rel rel
+                    ON rel.project_task_id = tree.task_id
+            ) AS task_package
+            JOIN tms_package package ON package.id = task_package.tms_package_id
+            GROUP BY task_package.root_id
+        )
+        UPDATE project_task task
+        SET volume = COALESCE(totals.volume, 0.0),
+            weight = COALESCE(totals.weight, 0.0),
+            number_of_packages = COALESCE(totals.number_of_packages, 0),
+            pallet_qty = COALESCE(totals.pallet_qty, 0),
+            euro_pallet_qty = COALESCE(totals.euro_pallet_qty, 0)
+        FROM totals
+        WHERE totals.root_id = task.id
+        """,
+    )
@@ -0,0 +1,10 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+from openupgradelib import openupgrade
+
+
+@openupgrade.migrate()
+def migrate(env, version):
+    # Automatic checkpoints are matched by type and week, fill them to keep
+    # existing checkpoints and their route estimations
+    env["project.task.checkpoint"]._fill_missing_keys()
@@ -2,9 +2,61 @@
 # Copyright 2017 Carlos Dauden <carlos.dauden@tecnativa.com>
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
-from odoo import models
+from odoo import api, models
 
 
 class AccountAnalyticLine(models.Model):
     _inherit = ["account.analytic.line", "tms.analytic"]
     _name = "account.analytic.line"
+
+    def _get_tasks_timesheet_count(self, tasks):
+        self.flush(["task_id"])
+        self.env.cr.execute(
+            """
+            SELECT task_id, COUNT(*) FROM account_analytic_line
+            WHERE task_id IN %s GROUP BY task_id
+            """,
+            (tuple(tasks.ids),),
+        )
+        return dict(self.env.cr.fetchall())
+
+    def _recompute_package_states(self, tasks, counts_before):
+        """Package state depends on tasks having timesheets, recompute it only
+        for tasks that got their first timesheet or lost the last one
+        """
+        if not tasks:
+            return
+        counts_after = self._get_tasks_timesheet_count(tasks)
+        changed_tasks = tasks.filtered(
+            lambda t: bool(counts_before.get(t.id)) != bool(counts_after.get(t.id))
+        )
+        packages = changed_tasks.mapped("tms_package_ids")
+        if packages:
+            self.env.add_to_compute(packages._fields["state"], packages)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        task_ids = [vals["task_id"] for vals in vals_list if vals.get("task_id")]
+        tasks = self.env["project.task"].browse(task_ids).exists()
+        counts_before = self._get_tasks_timesheet_count(tasks) if tasks else {}
+        lines = super().create(vals_list)
+        self._recompute_package_states(tasks | lines.mapped("task_id"), counts_before)
+        return lines
+
+    def write(self, vals):
+        if "task_id" not in vals:
+            return super().write(vals)
+        tasks = self.mapped("task_id") | self.env["project.task"].browse(
+            vals["task_id"]
+        )
+        counts_before = self._get_tasks_timesheet_count(tasks) if tasks else {}
+        res = super().write(vals)
+        self._recompute_package_states(tasks, counts_before)
+        return res
+
+    def unlink(self):
+        tasks = self.mapped("task_id")
+        counts_before = self._get_tasks_timesheet_count(tasks) if tasks else {}
+        res = super().unlink()
+        self._recompute_package_states(tasks.exists(), counts_before)
+        return res
@@ -3,10 +3,15 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
 
 from collections import defaultdict
+from datetime import timedelta
 
 from odoo import api, fields, models
 from odoo.osv import expression
 
+from ..tools.vehicle_availability import AvailabilityIndex
+
+WORKLOAD_CACHE_KEY = "tms_vehicle_workload"
+
 
 class FleetVehicle(models.Model):
     _inherit = "fleet.vehicle"
@@ -43,61 +48,271 @@ class FleetVehicle(models.Model):
         string="Sale Order Types",
     )
     task_pending_duration_estimated = fields.Float(compute="_compute_task_count")
+    task_date_free = fields.Datetime(
+        compute="_compute_task_count",
+        string="Free From",
+        help="Planned end of the last open task",
+    )
 
-    def _compute_task_count(self):
-        Task = self.env["project.task"]
-        max_tasks = max(self.env.context.get("max_vehicle_tasks", [0]))
-        # Keep only date fields to search vehicle tasks
+    @api.model
+    def _normalize_task_domain(self, task_domain):
+        """Keep only date fields to search vehicle tasks. Domains with the
+        same date terms joined by AND are normalized to the same list.
+        """
         # TODO: Use expression when fix https://github.com/odoo/odoo/issues/103214
         TRUE_DOMAIN = ("id", "!=", False)  # expression.TRUE_DOMAIN
-        task_domain = [
-            TRUE_DOMAIN if (isinstance(t, (list, tuple)) and "date" not in t[0]) else t
-            for t in self.env.context.get("task_domain", [])
+        domain = [
+            TRUE_DOMAIN
+            if (isinstance(t, (list, tuple)) and "date" not in t[0])
+            else (tuple(t) if isinstance(t, list) else t)
+            for t in task_domain or []
         ]
-        tasks_data = Task.read_group(
-            domain=expression.AND([[("stage_id.is_closed", "=", False)], task_domain]),
+        if not domain:
+            return []
+        domain = expression.normalize_domain(domain)
+        if all(t == expression.AND_OPERATOR for t in domain if isinstance(t, str)):
+            # Only AND operators, terms order and TRUE terms do not matter
+            terms = {
+                repr(t): t for t in domain if isinstance(t, tuple) and t != TRUE_DOMAIN
+            }
+            return [terms[key] for key in sorted(terms)]
+        return domain
+
+    @api.model
+    def _get_workload(self, task_domain=None):
+        """Open tasks number and pending duration by vehicle. Result is cached
+        in the transaction by task domain and company and cleared when tasks,
+        checkpoints or stages are changed.
+        :return: dict with vehicle id as key and dict with count and duration
+                 as value
+        """
+        domain = self._normalize_task_domain(task_domain)
+        cache = self.env.cr.cache.setdefault(WORKLOAD_CACHE_KEY, {})
+        key = (repr(domain), self.env.company.id, self.env.uid)
+        if key in cache:
+            return cache[key]
+        tasks_data = self.env["project.task"].read_group(
+            domain=expression.AND([[("stage_id.is_closed", "=", False)], domain]),
             fields=["tractor_id", "trailer_id", "pending_duration_estimated"],
             groupby=["tractor_id", "trailer_id"],
             lazy=False,
         )
         vehicle_task_dic = defaultdict(lambda: {"count": 0, "duration": 0.0})
         for group in tasks_data:
-            if group["tractor_id"]:
-                vehicle_task_dic[group["tractor_id"][0]]["count"] += group["__count"]
-                vehicle_task_dic[group["tractor_id"][0]]["duration"] += group[
-                    "pending_duration_estimated"
-                ]
-            if group["trailer_id"]:
-                vehicle_task_dic[group["trailer_id"][0]]["count"] += group["__count"]
-                vehicle_task_dic[group["trailer_id"][0]]["duration"] += group[
-                    "pending_duration_estimated"
-                ]
+            for vehicle_field in ("tractor_id", "trailer_id"):
+                if group[vehicle_field]:
+                    vehicle_values = vehicle_task_dic[group[vehicle_field][0]]
+                    vehicle_values["count"] += group["__count"]
+                    vehicle_values["duration"] += group["pending_duration_estimated"]
+        if not cache:
+            # Committed or rolled back data can be changed by other transactions
+            self.env.cr.postcommit.add(self._invalidate_workload)
+            self.env.cr.postrollback.add(self._invalidate_workload)
+        cache[key] = dict(vehicle_task_dic)
+        return cache[key]
+
+    @api.model
+    def _invalidate_workload(self):
+        self.env.cr.cache.pop(WORKLOAD_CACHE_KEY, None)
+
+    def _compute_task_count(self):
+        max_tasks = max(self.env.context.get("max_vehicle_tasks", [0]))
+        task_domain = self.env.context.get("task_domain", [])
+        workload = self.env["fleet.vehicle.workload"]._get_vehicles_workload(self.ids)
+        if any(isinstance(t, (list, tuple)) and "date" in t[0] for t in task_domain):
+            # Workload table has all open tasks, filter them by dates
+            domain_workload = self._get_workload(task_domain)
+        else:
+            domain_workload = workload
+        empty = {"count": 0, "duration": 0.0, "date_free": False}
         for vehicle in self:
-            vehicle.task_count = vehicle_task_dic[vehicle.id]["count"]
+            vehicle_workload = domain_workload.get(vehicle.id, empty)
+            vehicle.task_count = vehicle_workload["count"]
             vehicle.is_available = vehicle.task_count <= max_tasks
-            vehicle.task_pending_duration_estimated = vehicle_task_dic[vehicle.id][
-                "duration"
+            vehicle.task_pending_duration_estimated = vehicle_workload["duration"]
+            vehicle.task_date_free = workload.get(vehicle.id, empty)["date_free"]
+
+    @api.model
+    def _get_availability_index(self):
+        """Busy intervals of vehicles from open tasks of allowed companies.
+        Tasks are busy from start date, or now if not set, until the greatest
+        of end date and pending checkpoints estimated arrival. Index is cached
+        with workload.
+        :return: AvailabilityIndex with vehicle ids as keys
+        """
+        cache = self.env.cr.cache.setdefault(WORKLOAD_CACHE_KEY, {})
+        key = ("availability", tuple(self.env.companies.ids))
+        if key in cache:
+            return cache[key]
+        self.env["project.task"].flush(
+            [
+                "tractor_id",
+                "trailer_id",
+                "stage_id",
+                "active",
+                "company_id",
+                "date_start",
+                "date_end",
+                "pending_duration_estimated",
             ]
+        )
+        self.env["project.task.type"].flush(["is_closed"])
+        now = fields.Datetime.now()
+        self.env.cr.execute(
+            """
+            SELECT task.tractor_id, task.trailer_id,
+                COALESCE(task.date_start, %(now)s) AS date_start,
+                GREATEST(
+                    task.date_end,
+                    GREATEST(task.date_start, %(now)s)
+                    + COALESCE(task.pending_duration_estimated, 0.0)
+                    * INTERVAL '1 hour'
+                ) AS date_end
+            FROM project_task task
+            JOIN project_task_type stage ON stage.id = task.stage_id
+            WHERE task.active
+                AND stage.is_closed IS NOT TRUE
+                AND (task.tractor_id IS NOT NULL OR task.trailer_id IS NOT NULL)
+                AND task.company_id IN %(company_ids)s
+            """,
+            {"now": now, "company_ids": tuple(self.env.companies.ids)},
+        )
+        intervals = []
+        for tractor_id, trailer_id, date_start, date_end in self.env.cr.fetchall():
+            for vehicle_id in {tractor_id, trailer_id} - {None}:
+                intervals.append((vehicle_id, date_start, date_end))
+        if not cache:
+            self.env.cr.postcommit.add(self._invalidate_workload)
+            self.env.cr.postrollback.add(self._invalidate_workload)
+        cache[key] = AvailabilityIndex(intervals)
+        return cache[key]
+
+    def get_free_vehicles(self, date_start, date_end):
+        """Vehicles without open tasks between dates"""
+        index = self._get_availability_index()
+        return self.browse(
+            index.free_between(
+                self.ids,
+                fields.Datetime.to_datetime(date_start),
+                fields.Datetime.to_datetime(date_end),
+            )
+        )
+
+    def get_next_free_slots(self, date_from, hours=0.0):
+        """First time from date_from that each vehicle is free during hours
+        :return: dict with vehicle id as key and datetime as value
+        """
+        return self._get_availability_index().next_free_slots(
+            self.ids, fields.Datetime.to_datetime(date_from), timedelta(hours=hours)
+        )
+
+    def _get_last_positions(self):
+        """Coordinates of last geolocated checkpoint place of the latest task
+        of each vehicle as tractor
+        :return: dict with vehicle id as key and (latitude, longitude) tuple
+                 as value
+        """
+        vehicle_ids = tuple(i for i in self.ids if isinstance(i, int))
+        if not vehicle_ids:
+            return {}
+        self.env["project.task"].flush(
+            ["tractor_id", "active", "date_start", "date_end"]
+        )
+        self.env["project.task.checkpoint"].flush(["task_id", "place_id", "sequence"])
+        self.env["res.partner"].flush(["partner_latitude", "partner_longitude"])
+        self.env.cr.execute(
+            """
+            SELECT DISTINCT ON (task.tractor_id) task.tractor_id,
+                place.partner_latitude, place.partner_longitude
+            FROM project_task task
+            JOIN project_task_checkpoint checkpoint
+                ON checkpoint.task_id = task.id
+            JOIN res_partner place ON place.id = checkpoint.place_id
+            WHERE task.tractor_id IN %s
+                AND task.active
+                AND COALESCE(place.partner_latitude, 0.0) != 0.0
+                AND COALESCE(place.partner_longitude, 0.0) != 0.0
+            ORDER BY task.tractor_id,
+                COALESCE(task.date_end, task.date_start, task.create_date) DESC,
+                task.id DESC, checkpoint.sequence DESC, checkpoint.id DESC
+            """,
+            (vehicle_ids,),
+        )
+        return {
+            vehicle_id: (latitude, longitude)
+            for vehicle_id, latitude, longitude in self.env.cr.fetchall()
+        }
 
+    @api.depends_context("uid", "allowed_company_ids", "next_checkpoints_limit")
     def _compute_next_checkpoint_ids(self):
+        """Checkpoints of tasks in progress. With next_checkpoints_limit in
+        context only that number of checkpoints pending of departure are
+        returned for each vehicle.
         """
-        Search checkpoints in task in progress
-        :return: dict with vehicle_id as key and checpoints as value
+        checkpoints_map = self._get_next_checkpoint_ids_map(
+            self.env.context.get("next_checkpoints_limit")
+        )
+        for vehicle in self:
+            vehicle.next_checkpoint_ids = [(6, 0, checkpoints_map.get(vehicle.id, []))]
+
+    def _get_next_checkpoint_ids_map(self, limit=None):
+        """Checkpoints of tasks in progress by tractor, ordered by task and
+        checkpoint sequence
+        :param limit: maximum number of checkpoints without departure time
+                      by vehicle
+        :return: dict with vehicle id as key and list of checkpoint ids as
+                 value
         """
-        ProjectTaskCheckpoint = self.env["project.task.checkpoint"]
-        tasks = self.env["project.task"].search(
+        vehicle_ids = tuple(i for i in self.ids if isinstance(i, int))
+        if not vehicle_ids:
+            return {}
+        self.env["project.task"].flush(
+            ["tractor_id", "stage_id", "active", "priority", "sequence", "company_id"]
+        )
+        self.env["project.task.type"].flush(["sequence", "is_closed"])
+        self.env["project.task.checkpoint"].flush(
+            ["task_id", "sequence", "departure_time"]
+        )
+        # Only tasks of allowed companies readable by the user
+        Task = self.env["project.task"]
+        query = Task._where_calc(
             [
-                ("stage_id.sequence", ">", 1),
-                ("stage_id.is_closed", "=", False),
-                ("tractor_id", "in", self.ids),
+                ("tractor_id", "in", vehicle_ids),
+                ("company_id", "in", self.env.companies.ids),
             ]
         )
-        # TODO: Review
-        vehicles_dic = {vehicle: ProjectTaskCheckpoint for vehicle in self}
-        for task in tasks:
-            vehicles_dic[task.tractor_id] |= task.checkpoint_ids
-        for vehicle, checkpoints in vehicles_dic.items():
-            vehicle.next_checkpoint_ids = checkpoints
+        Task._apply_ir_rules(query, "read")
+        task_query, task_params = query.select('"project_task"."id"')
+        self.env.cr.execute(
+            """
+            SELECT tractor_id, checkpoint_id FROM (
+                SELECT task.tractor_id, checkpoint.id AS checkpoint_id,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY task.tractor_id
+                        ORDER BY task.priority DESC, task.sequence, task.id DESC,
+                            checkpoint.sequence, checkpoint.id
+                    ) AS position
+                FROM project_task task
+                JOIN project_task_type stage ON stage.id = task.stage_id
+                JOIN project_task_checkpoint checkpoint
+                    ON checkpoint.task_id = task.id
+                WHERE task.id IN ({task_query})
+                    AND task.active
+                    AND stage.sequence > 1
+                    AND stage.is_closed IS NOT TRUE
+                    AND (%s IS NULL OR checkpoint.departure_time IS NULL)
+            ) AS next_checkpoint
+            WHERE %s IS NULL OR position <= %s
+            ORDER BY tractor_id, position
+            """.format(
+                task_query=task_query
+            ),
+            list(task_params) + [limit, limit, limit],
+        )
+        checkpoints_map = defaultdict(list)
+        for vehicle_id, checkpoint_id in self.env.cr.fetchall():
+            checkpoints_map[vehicle_id].append(checkpoint_id)
+        return checkpoints_map
 
     @api.depends("company_owner_id")
     def _compute_is_own_vehicle(self):
@@ -15,3 +15,12 @@ class FleetVehicleModel(models.Model):
         ],
         ondelete={"tractor": "set default", "trailer": "set default"},
     )
+    average_speed = fields.Float(
+        string="Average Speed (km/h)",
+        help="Used to estimate route duration without route provider. "
+        "If empty the general setting is used.",
+    )
+    circuity_factor = fields.Float(
+        help="Ratio between route and great circle distances used to estimate "
+        "routes without route provider. If empty the general setting is used.",
+    )
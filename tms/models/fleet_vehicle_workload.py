@@ -0,0 +1,164 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, fields, models
+
+DIRTY_KEY = "fleet.vehicle.workload.dirty"
+
+
+class FleetVehicleWorkload(models.Model):
+    """Open tasks totals by vehicle and task company.
+
+    Rows of vehicles changed in the transaction are marked as dirty and
+    recomputed with one query before reading them or committing.
+    """
+
+    _name = "fleet.vehicle.workload"
+    _description = "Fleet Vehicle Workload"
+    _log_access = False
+
+    vehicle_id = fields.Many2one(
+        comodel_name="fleet.vehicle",
+        string="Vehicle",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    company_id = fields.Many2one(comodel_name="res.company", string="Company")
+    task_count = fields.Integer(string="Open Tasks")
+    pending_duration = fields.Float()
+    date_free = fields.Datetime(
+        string="Free From",
+        help="Planned end of the last open task",
+    )
+
+    _sql_constraints = [
+        (
+            "vehicle_company_uniq",
+            "unique(vehicle_id, company_id)",
+            "Only one workload by vehicle and company",
+        )
+    ]
+
+    @api.model
+    def _mark_dirty(self, vehicle_ids):
+        """Recompute workload of vehicles before reading it or committing"""
+        vehicle_ids = {i for i in vehicle_ids if isinstance(i, int)}
+        if not vehicle_ids:
+            return
+        precommit = self.env.cr.precommit
+        if DIRTY_KEY not in precommit.data:
+            precommit.data[DIRTY_KEY] = set()
+            precommit.add(self._refresh_dirty)
+        precommit.data[DIRTY_KEY] |= vehicle_ids
+
+    @api.model
+    def _refresh_dirty(self):
+        vehicle_ids = self.env.cr.precommit.data.pop(DIRTY_KEY, None)
+        if vehicle_ids:
+            self._refresh(list(vehicle_ids))
+
+    @api.model
+    def _refresh(self, vehicle_ids=None):
+        """Recompute workload rows of vehicles, all of them if not given"""
+        self.env["project.task"].flush(
+            [
+                "tractor_id",
+                "trailer_id",
+                "stage_id",
+                "active",
+                "company_id",
+                "pending_duration_estimated",
+                "date_start",
+                "date_end",
+            ]
+        )
+        self.env["project.task.type"].flush(["is_closed"])
+        params = {"vehicle_ids": tuple(vehicle_ids or [0])}
+        vehicle_where = "" if vehicle_ids is None else "AND {} IN %(vehicle_ids)s"
+        if vehicle_ids is None:
+            self.env.cr.execute("DELETE FROM fleet_vehicle_workload")
+        else:
+            self.env.cr.execute(
+                "DELETE FROM fleet_vehicle_workload WHERE vehicle_id IN %(vehicle_ids)s",
+                params,
+            )
+        task_query = """
+            SELECT task.{vehicle_field} AS vehicle_id,
+                task.company_id,
+                COALESCE(task.pending_duration_estimated, 0.0) AS duration,
+                COALESCE(
+                    task.date_end,
+                    task.date_start
+                    + COALESCE(task.pending_duration_estimated, 0.0)
+                    * INTERVAL '1 hour'
+                ) AS date_end
+            FROM project_task task
+            JOIN project_task_type stage ON stage.id = task.stage_id
+            WHERE task.active
+                AND stage.is_closed IS NOT TRUE
+                AND task.{vehicle_field} IS NOT NULL
+                {vehicle_where}
+        """
+        self.env.cr.execute(
+            """
+            WITH task_vehicle AS (
+                {tractor_query}
+                UNION ALL
+                {trailer_query}
+            )
+            INSERT INTO fleet_vehicle_workload (
+                vehicle_id, company_id, task_count, pending_duration, date_free
+            )
+            SELECT vehicle_id, company_id, COUNT(*), SUM(duration), MAX(date_end)
+            FROM task_vehicle
+            GROUP BY vehicle_id, company_id
+            ON CONFLICT (vehicle_id, company_id) DO UPDATE SET
+                task_count = EXCLUDED.task_count,
+                pending_duration = EXCLUDED.pending_duration,
+                date_free = EXCLUDED.date_free
+            """.format(
+                tractor_query=task_query.format(
+                    vehicle_field="tractor_id",
+                    vehicle_where=vehicle_where.format("task.tractor_id"),
+                ),
+                trailer_query=task_query.format(
+                    vehicle_field="trailer_id",
+                    vehicle_where=vehicle_where.format("task.trailer_id"),
+                ),
+            ),
+            params,
+        )
+        self.invalidate_cache()
+
+    @api.model
+    def rebuild(self):
+        """Recompute workload of all vehicles"""
+        self.env.cr.precommit.data.pop(DIRTY_KEY, None)
+        self._refresh()
+
+    @api.model
+    def _get_vehicles_workload(self, vehicle_ids):
+        """Workload of vehicles in allowed companies
+        :return: dict with vehicle id as key and dict with count, duration and
+                 date_free as value
+        """
+        self._refresh_dirty()
+        vehicle_ids = [i for i in vehicle_ids if isinstance(i, int)]
+        if not vehicle_ids:
+            return {}
+        self.env.cr.execute(
+            """
+            SELECT vehicle_id, SUM(task_count), SUM(pending_duration),
+                MAX(date_free)
+            FROM fleet_vehicle_workload
+            WHERE vehicle_id IN %s
+                AND (company_id IS NULL OR company_id IN %s)
+            GROUP BY vehicle_id
+            """,
+            (tuple(vehicle_ids), tuple(self.env.companies.ids)),
+        )
+        return {
+            vehicle_id: {"count": count, "duration": duration, "date_free": date_free}
+            for vehicle_id, count, duration, date_free in self.env.cr.fetchall()
+        }
@@ -2,16 +2,17 @@
 # Copyright 2017 Carlos Dauden <carlos.dauden@tecnativa.com>
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
-import json
 import logging
 from collections import defaultdict
+from datetime import timedelta
 
-import requests
-
-from odoo import SUPERUSER_ID, _, api, exceptions, fields, models
+from odoo import SUPERUSER_ID, _, api, fields, models
 from odoo.exceptions import ValidationError
 from odoo.osv import expression
 
+from ..tools.route_optimizer import optimize_route
+from ..tools.vehicle_assignment import assign_tasks
+
 _logger = logging.getLogger(__name__)
 
 
@@ -176,21 +177,31 @@ class ProjectTask(models.Model):
     free_stoped_time = fields.Float()
     volume = fields.Float(
         compute="_compute_package_totals",
+        store=True,
+        recursive=True,
         digits="TMS Volume",
     )
     weight = fields.Float(
         compute="_compute_package_totals",
+        store=True,
+        recursive=True,
         digits="TMS Weight",
     )
     number_of_packages = fields.Integer(
         compute="_compute_package_totals",
+        store=True,
+        recursive=True,
     )
     pallet_qty = fields.Integer(
         compute="_compute_package_totals",
+        store=True,
+        recursive=True,
         string="Pallets",
     )
     euro_pallet_qty = fields.Integer(
         compute="_compute_package_totals",
+        store=True,
+        recursive=True,
         string="Euro Pallets",
     )
     tractor_id = fields.Many2one(group_expand="_read_group_tractor_ids")
@@ -208,16 +219,56 @@ class ProjectTask(models.Model):
     pending_duration_estimated = fields.Float(
         compute="_compute_pending_duration_estimated", store=True
     )
+    route_geometry = fields.Text(
+        copy=False,
+        help="Encoded polyline of estimated route, one line for each request "
+        "to route provider.",
+    )
 
     @api.depends("tms_package_ids", "child_ids")
     def _compute_tms_package_all_ids(self):
+        packages_map = self.filtered("id")._get_tms_package_all_ids_map()
         for task in self:
-            if task.child_ids:
-                alltasks = task.search([("id", "child_of", [task.id])])
-                tms_packages = alltasks.mapped("tms_package_ids")
+            if task.id in packages_map:
+                task.tms_package_all_ids = packages_map[task.id]
             else:
-                tms_packages = task.tms_package_ids
-            task.tms_package_all_ids = tms_packages.sorted("sequence")
+                task.tms_package_all_ids = task.tms_package_ids.sorted("sequence")
+
+    def _get_tms_package_all_ids_map(self):
+        """Packages of tasks and all its active descendants in one query
+        :return: dict with task id as key and packages sorted by sequence
+        """
+        if not self:
+            return {}
+        self.flush(["tms_package_ids", "parent_id", "active"])
+        self.env["tms.package"].flush(["sequence"])
+        self.env.cr.execute(
+            """
+            WITH RECURSIVE tree(root_id, task_id) AS (
+                SELECT id, id FROM project_task WHERE id IN %s
+                UNION
+                SELECT tree.root_id, child.id
+                FROM tree
+                JOIN project_task child ON child.parent_id = tree.task_id
+                WHERE child.active
+            )
+            SELECT root_id, array_agg(package_id ORDER BY sequence, package_id DESC)
+            FROM (
+                SELECT DISTINCT tree.root_id, package.id AS package_id,
+                    package.sequence
+                FROM tree
+                JOIN project_task_tms_package_rel rel
+                    ON rel.project_task_id = tree.task_id
+                JOIN tms_package package ON package.id = rel.tms_package_id
+            ) AS task_package
+            GROUP BY root_id
+            """,
+            (tuple(self.ids),),
+        )
+        packages_map = dict.fromkeys(self.ids, self.env["tms.package"])
+        for task_id, package_ids in self.env.cr.fetchall():
+            packages_map[task_id] = self.env["tms.package"].browse(package_ids)
+        return packages_map
 
     @api.depends(
         "tms_package_ids.shipping_weight",
@@ -225,12 +276,24 @@ class ProjectTask(models.Model):
         "tms_package_ids.number_of_packages",
         "tms_package_ids.pallet_qty",
         "tms_package_ids.euro_pallet_qty",
+        "child_ids.active",
+        "child_ids.weight",
+        "child_ids.volume",
+        "child_ids.number_of_packages",
+        "child_ids.pallet_qty",
+        "child_ids.euro_pallet_qty",
     )
     def _compute_package_totals(self):
+        """Totals of task and descendants packages. Changes in descendants are
+        propagated through child_ids totals, but values are summed from the
+        packages of the whole subtree to count shared packages once.
+        """
+        packages_map = self.filtered("id")._get_tms_package_all_ids_map()
         for task in self:
             weight = volume = number_of_packages = 0.0
             pallet_qty = euro_pallet_qty = 0.0
-            for package in task.tms_package_all_ids:
+            packages = packages_map.get(task.id, task.tms_package_ids)
+            for package in packages:
                 weight += package.shipping_weight
                 volume += package.shipping_volume
                 number_of_packages += package.number_of_packages
@@ -375,16 +438,29 @@ class ProjectTask(models.Model):
             sale_lines.with_context(write_from_task=True).write(sale_line_vals)
 
     def _check_incompatible_tags(self, vals):
-        fleet_vehicle = self.env["fleet.vehicle"]
-        if "tractor_id" in vals or "trailer_id" in vals:
-            for task in self:
-                if task.trailer_requirement_ids:
-                    vehicles = fleet_vehicle.browse(
-                        [vals.get("tractor_id", False), vals.get("trailer_id", False)]
-                    )
-                    tags = vehicles.mapped("tag_ids")
-                    if not task.trailer_requirement_ids <= tags:
-                        raise ValidationError(_("Incompatible equipment"))
+        """Tractor and trailer in vals must have the trailer tags required by
+        checkpoint places of all tasks
+        """
+        if "tractor_id" not in vals and "trailer_id" not in vals:
+            return
+        requirements_map = self._get_trailer_requirement_ids_map()
+        if not requirements_map:
+            return
+        vehicle_ids = [vals.get("tractor_id"), vals.get("trailer_id")]
+        tags = set(
+            self.env["fleet.vehicle"]
+            .browse([vehicle_id for vehicle_id in vehicle_ids if vehicle_id])
+            .mapped("tag_ids")
+            .ids
+        )
+        incompatible_tasks = self.filtered(
+            lambda t: not requirements_map.get(t.id, set()) <= tags
+        )
+        if incompatible_tasks:
+            raise ValidationError(
+                _("Incompatible equipment in tasks:\n%s")
+                % "\n".join(incompatible_tasks.mapped("display_name"))
+            )
 
     def write(self, vals):
         # Onchange values are not stored when drag and drop in kanban view
@@ -392,17 +468,21 @@ class ProjectTask(models.Model):
             self.env.context.get("params", {}).get("view_type", "") == "kanban"
         )
         if force_onchange and "tractor_id" in vals:
-            dummy_task = self.new({"tractor_id": vals["tractor_id"]})
-            dummy_task._onchange_tractor_id()
-            dummy_task._onchange_tractor_id_user()
-            dummy_task._onchange_driver_id()
-            new_vals = dummy_task._convert_to_write(dummy_task._cache)
             vals.pop("sale_line_id", None)
-            vals.update(new_vals)
-        elif force_onchange and "driver_id" in vals:
-            dummy_task = self.new({"driver_id": vals["driver_id"]})
-            dummy_task._onchange_driver_id()
-            vals.update(dummy_task._convert_to_write(dummy_task._cache))
+            vals.update(
+                self._get_tractor_vals(
+                    self.env["fleet.vehicle"].browse(vals["tractor_id"])
+                )
+            )
+        elif (
+            force_onchange
+            and "driver_id" in vals
+            and "vendor_id" in self._fields
+            and not self.env.context.get("skip_driver_onchange")
+        ):
+            vals["vendor_id"] = self._get_driver_vendor(
+                self.env["res.partner"].browse(vals["driver_id"])
+            )
         if "parent_id" in vals:
             parent_task = self.browse(vals["parent_id"])
             for field in self.child_sync_field_list():
@@ -419,7 +499,72 @@ class ProjectTask(models.Model):
             if child_vals:
                 vals["child_ids"] = [(1, x.id, child_vals) for x in childs]
         self.write_sale_fields(vals)
-        return super().write(vals)
+        workload_changed = any(field in vals for field in self._workload_fields())
+        if workload_changed:
+            self._mark_workload_dirty()
+        res = super().write(vals)
+        self.env["fleet.vehicle"]._invalidate_workload()
+        if workload_changed:
+            self._mark_workload_dirty()
+        if not self.env.context.get("tms_route_job_skip") and any(
+            field in vals for field in self._route_job_fields()
+        ):
+            self._enqueue_route_job(fill_checkpoints=True)
+        return res
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        tasks = super().create(vals_list)
+        self.env["fleet.vehicle"]._invalidate_workload()
+        tasks._mark_workload_dirty()
+        tasks._enqueue_route_job(fill_checkpoints=True)
+        return tasks
+
+    def unlink(self):
+        self.env["fleet.vehicle"]._invalidate_workload()
+        self._mark_workload_dirty()
+        return super().unlink()
+
+    @api.model
+    def _workload_fields(self):
+        """Fields that change vehicles workload"""
+        return [
+            "tractor_id",
+            "trailer_id",
+            "stage_id",
+            "active",
+            "company_id",
+            "date_start",
+            "date_end",
+        ]
+
+    def _mark_workload_dirty(self):
+        self.env["fleet.vehicle.workload"]._mark_dirty(
+            self.mapped("tractor_id").ids + self.mapped("trailer_id").ids
+        )
+
+    @api.model
+    def _route_job_fields(self):
+        """Fields that change automatic checkpoints"""
+        return [
+            "tms_package_ids",
+            "parent_id",
+            "release_id",
+            "shipping_origin_id",
+            "shipping_destination_id",
+            "acceptance_id",
+            "force_origin",
+            "force_destination",
+        ]
+
+    def _enqueue_route_job(self, fill_checkpoints=False):
+        """Enqueue tasks and its parents, that include their packages"""
+        if not self or self.env.context.get("tms_route_job_skip"):
+            return
+        tasks = self
+        if fill_checkpoints and self.mapped("parent_id"):
+            tasks = self.search([("id", "parent_of", self.ids)])
+        self.env["tms.route.job"].enqueue(tasks, fill_checkpoints=fill_checkpoints)
 
     @api.model
     def map_task2vehicle_fields(self):
@@ -459,11 +604,217 @@ class ProjectTask(models.Model):
         )
         tractors = tractors.browse(tractor_ids)
         if "max_vehicle_tasks" in self.env.context:
-            tractors = tractors.with_context(task_domain=domain).filtered(
-                "is_available"
-            )
+            window = self._get_domain_date_window(domain)
+            if window:
+                # Tasks overlapping filtered dates instead of tasks count
+                max_tasks = max(self.env.context["max_vehicle_tasks"])
+                index = tractors._get_availability_index()
+                tractors = tractors.filtered(
+                    lambda t: index.count_busy(t.id, *window) <= max_tasks
+                )
+            else:
+                tractors = tractors.with_context(task_domain=domain).filtered(
+                    "is_available"
+                )
         return tractors.sorted(key="task_pending_duration_estimated")
 
+    @api.model
+    def _get_domain_date_window(self, domain):
+        """Time window from task date terms in domain
+        :return: (start, end) tuple or None if domain has no date bounds or
+                 they are not a valid window
+        """
+        starts, ends = [], []
+        for term in domain:
+            if (
+                not isinstance(term, (list, tuple))
+                or term[0] not in ("date_start", "date_end")
+                or not term[2]
+            ):
+                continue
+            if term[1] in (">=", ">"):
+                starts.append(fields.Datetime.to_datetime(term[2]))
+            elif term[1] in ("<=", "<"):
+                ends.append(fields.Datetime.to_datetime(term[2]))
+        if not (starts or ends):
+            return None
+        start = max(starts) if starts else fields.Datetime.now()
+        end = min(ends) if ends else fields.datetime.max
+        if start >= end:
+            return None
+        return start, end
+
+    @api.model
+    def _get_tractor_vals(self, tractor):
+        vals = super()._get_tractor_vals(tractor)
+        # Normally is only one user linked
+        users = tractor.driver_id.user_ids
+        if users:
+            vals["user_ids"] = [(6, 0, users.ids)]
+        return vals
+
+    @api.model
+    def _get_tractor_vals_map(self, tractors):
+        """:return: dict with tractor id as key and task values as value"""
+        # Prefetch related records of all tractors at once
+        tractors.mapped("driver_id.commercial_partner_id.ref_company_ids")
+        tractors.mapped("driver_id.user_ids")
+        return {tractor.id: self._get_tractor_vals(tractor) for tractor in tractors}
+
+    def _get_trailer_requirement_ids_map(self):
+        """Trailer tags required by checkpoint places of tasks
+        :return: dict with task id as key and set of tag ids as value
+        """
+        task_ids = tuple(self.filtered("id").ids)
+        if not task_ids:
+            return {}
+        self.env["project.task.checkpoint"].flush(["task_id", "place_id"])
+        self.env["res.partner"].flush(["trailer_tag_ids"])
+        self.env.cr.execute(
+            """
+            SELECT checkpoint.task_id, rel.fleet_vehicle_tag_id
+            FROM project_task_checkpoint checkpoint
+            JOIN res_partner_fleet_trailer_tag_rel rel
+                ON rel.res_partner_id = checkpoint.place_id
+            WHERE checkpoint.task_id IN %s
+            """,
+            (task_ids,),
+        )
+        requirements_map = defaultdict(set)
+        for task_id, tag_id in self.env.cr.fetchall():
+            requirements_map[task_id].add(tag_id)
+        return requirements_map
+
+    def _get_route_ends_map(self):
+        """Coordinates of first and last geolocated checkpoint places
+        :return: dict with task id as key and (origin, destination) tuple as
+                 value, with (latitude, longitude) tuples
+        """
+        task_ids = tuple(self.filtered("id").ids)
+        if not task_ids:
+            return {}
+        self.env["project.task.checkpoint"].flush(["task_id", "place_id", "sequence"])
+        self.env["res.partner"].flush(["partner_latitude", "partner_longitude"])
+        ends_map = {}
+        for position, direction in enumerate(("ASC", "DESC")):
+            self.env.cr.execute(
+                """
+                SELECT DISTINCT ON (checkpoint.task_id) checkpoint.task_id,
+                    place.partner_latitude, place.partner_longitude
+                FROM project_task_checkpoint checkpoint
+                JOIN res_partner place ON place.id = checkpoint.place_id
+                WHERE checkpoint.task_id IN %s
+                    AND COALESCE(place.partner_latitude, 0.0) != 0.0
+                    AND COALESCE(place.partner_longitude, 0.0) != 0.0
+                ORDER BY checkpoint.task_id, checkpoint.sequence {direction},
+                    checkpoint.id {direction}
+                """.format(
+                    direction=direction
+                ),
+                (task_ids,),
+            )
+            for task_id, latitude, longitude in self.env.cr.fetchall():
+                ends = ends_map.setdefault(task_id, [None, None])
+                ends[position] = (latitude, longitude)
+        return {task_id: tuple(ends) for task_id, ends in ends_map.items()}
+
+    def _prepare_assignment_tasks(self, default_hours):
+        """Tasks data for assignment engine"""
+        now = fields.Datetime.now()
+        attribute_fields = list(self.map_task2vehicle_fields())
+        requirements_map = self._get_trailer_requirement_ids_map()
+        ends_map = self._get_route_ends_map()
+        tasks_data = []
+        for values in self.read(
+            ["date_start", "date_end", "planned_hours"] + attribute_fields, load=False
+        ):
+            start = values["date_start"] or now
+            end = values["date_end"] or start + timedelta(
+                hours=values["planned_hours"] or default_hours
+            )
+            origin, destination = ends_map.get(values["id"], (None, None))
+            tasks_data.append(
+                {
+                    "id": values["id"],
+                    "start": start,
+                    "end": max(start, end),
+                    "requirements": requirements_map.get(values["id"], set()),
+                    "attributes": {field: values[field] for field in attribute_fields},
+                    "origin": origin,
+                    "destination": destination,
+                }
+            )
+        return tasks_data
+
+    @api.model
+    def _prepare_assignment_vehicles(self, tractors):
+        """Tractors data for assignment engine"""
+        task2vehicle_map = self.map_task2vehicle_fields()
+        positions = tractors._get_last_positions()
+        trailers_tags = {
+            values["id"]: set(values["tag_ids"])
+            for values in tractors.mapped("trailer_id").read(["tag_ids"], load=False)
+        }
+        vehicles_data = []
+        for values in tractors.read(
+            ["trailer_id", "tag_ids"] + list(set(task2vehicle_map.values())),
+            load=False,
+        ):
+            attributes = {}
+            for task_field, vehicle_field in task2vehicle_map.items():
+                value = values[vehicle_field]
+                if isinstance(value, list):
+                    attributes[task_field] = set(value)
+                else:
+                    attributes[task_field] = {value} if value else set()
+            vehicles_data.append(
+                {
+                    "id": values["id"],
+                    "trailer_id": values["trailer_id"],
+                    "tags": set(values["tag_ids"])
+                    | trailers_tags.get(values["trailer_id"], set()),
+                    "attributes": attributes,
+                    "position": positions.get(values["id"]),
+                }
+            )
+        return vehicles_data
+
+    def assign_vehicles(self, tractors=None, apply=True, default_hours=1.0):
+        """Assign tractor, its trailer and driver to open tasks without
+        tractor. Tractors must have the tags required by checkpoint places,
+        match task fields in map_task2vehicle_fields and be free in the task
+        dates. The nearest one to the task origin is chosen.
+        :param tractors: candidate tractors, all of them if not given
+        :param apply: write assignments, otherwise only return them
+        :param default_hours: duration of tasks without end date or estimated
+                              duration
+        :return: dict with task id as key and tractor id as value
+        """
+        tasks = self.filtered(lambda t: not t.tractor_id and not t.stage_id.is_closed)
+        if tractors is None:
+            tractors = self.env["fleet.vehicle"].search(
+                [("vehicle_type", "=", "tractor")]
+            )
+        max_deadhead_km = float(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("tms.assign_max_deadhead_km", 0.0)
+        )
+        assignments = assign_tasks(
+            tasks._prepare_assignment_tasks(default_hours),
+            self._prepare_assignment_vehicles(tractors),
+            tractors._get_availability_index(),
+            max_deadhead_km=max_deadhead_km,
+        )
+        if apply and assignments:
+            tractor_tasks = defaultdict(list)
+            for task_id, tractor_id in assignments.items():
+                tractor_tasks[tractor_id].append(task_id)
+            vals_map = self._get_tractor_vals_map(tractors.browse(list(tractor_tasks)))
+            for tractor_id, task_ids in tractor_tasks.items():
+                self.browse(task_ids).write(vals_map[tractor_id])
+        return assignments
+
     def _all_places(self):
         places = self.release_id | self.shipping_origin_id
         if not self.force_origin:
@@ -476,6 +827,10 @@ class ProjectTask(models.Model):
         return places
 
     def get_checkpoint_key(self, package, orig_dest):
+        """Checkpoint key of a task package, override it to change how
+        packages are grouped in checkpoints
+        :return: (place, calendar week, orig_dest)
+        """
         self.ensure_one()
         date = package.pickup_date or fields.datetime.max
         # Evaluate force_xx to set place from task instead of package
@@ -487,55 +842,242 @@ class ProjectTask(models.Model):
         # Group checkpoints in same calendar week
         return place, date.strftime("%Y%W"), orig_dest
 
+    @api.model
+    def _get_checkpoint_key(self, task_values, package_values, orig_dest):
+        """Checkpoint key from task and package values read with load=False,
+        same as get_checkpoint_key without browsing records
+        :return: (place id, calendar week, orig_dest)
+        """
+        if type(self).get_checkpoint_key is not ProjectTask.get_checkpoint_key:
+            # Keep overrides of get_checkpoint_key working
+            place, week, orig_dest = self.browse(task_values["id"]).get_checkpoint_key(
+                self.env["tms.package"].browse(package_values["id"]), orig_dest
+            )
+            return place.id, week, orig_dest
+        date = package_values["pickup_date"] or fields.datetime.max
+        # Evaluate force_xx to set place from task instead of package
+        place_id = (
+            task_values if task_values["force_{}".format(orig_dest)] else package_values
+        )["shipping_{}_id".format(orig_dest)]
+        if orig_dest == "destination" and package_values["forecast_unload_date"]:
+            date = package_values["forecast_unload_date"]
+        # Group checkpoints in same calendar week
+        return place_id, date.strftime("%Y%W"), orig_dest
+
     def _prepare_checkpoint_vals(self, key, packages, sequence):
         self.ensure_one()
-        place = key[0]
-        orig_dest = key[2]
+        place_id, week, orig_dest = key
         return {
-            "place_id": place.id,
+            "task_id": self.id,
+            "place_id": place_id,
             "sequence": sequence,
             "automatic": True,
+            "week": week,
+            "checkpoint_type": orig_dest,
             "package_{}_ids".format(orig_dest): [(6, 0, packages)],
         }
 
+    @api.model
+    def _get_checkpoints_plan(self, task_values, packages_values):
+        """Automatic checkpoints expected for a task
+        :param task_values: task values read with load=False
+        :param packages_values: values of task packages read with load=False
+        :return: list of (key, package ids, sequence)
+        """
+        checkpoints_dic = defaultdict(list)
+        for orig_dest in ("origin", "destination"):
+            for package_values in packages_values:
+                key = self._get_checkpoint_key(task_values, package_values, orig_dest)
+                if not key[0]:
+                    continue
+                checkpoints_dic[key].append(package_values["id"])
+        plan = []
+        seq = 0
+        init_place = task_values["release_id"] or task_values["shipping_origin_id"]
+        last_place = init_place
+        for key, packages in sorted(
+            checkpoints_dic.items(),
+            key=lambda kv: (0 if kv[0][2] == "origin" else 1, kv[0][1]),
+        ):
+            # Add release_id or task origin as first checkpoint
+            if init_place and seq == 0 and key[0] != init_place:
+                plan.append(((init_place, False, "origin"), [], seq))
+            seq += 5
+            plan.append((key, packages, seq))
+            last_place = key[0]
+        # Add acceptance_id checkpoint or task destination as last checkpoint
+        end_place = (
+            task_values["acceptance_id"] or task_values["shipping_destination_id"]
+        )
+        if end_place and end_place != last_place:
+            seq += 5
+            plan.append(((end_place, False, "destination"), [], seq))
+        return plan
+
+    def _checkpoints_places(self):
+        """Places of tasks checkpoints in route order
+        :return: dict with task id as key and list of place ids as value
+        """
+        places = defaultdict(list)
+        for checkpoint in self.env["project.task.checkpoint"].search_read(
+            [("task_id", "in", self.ids)],
+            ["task_id", "place_id"],
+            order="sequence, id",
+            load=False,
+        ):
+            places[checkpoint["task_id"]].append(checkpoint["place_id"])
+        return places
+
     def fill_checkpoints(self):
+        """Update automatic checkpoints from packages. Existing checkpoints
+        with the same place, week and type are kept with its route estimation
+        and relative order, and only differences are written. Data of all tasks is read at once and
+        checkpoints are created and removed in one call.
+        :return: tasks with changed checkpoints places
+        """
+        Checkpoint = self.env["project.task.checkpoint"]
+        places_before = self._checkpoints_places()
+        tasks_data = self.read(
+            [
+                "release_id",
+                "shipping_origin_id",
+                "shipping_destination_id",
+                "acceptance_id",
+                "force_origin",
+                "force_destination",
+                "tms_package_all_ids",
+            ],
+            load=False,
+        )
+        package_ids = {
+            pid for task in tasks_data for pid in task["tms_package_all_ids"]
+        }
+        packages_data = {
+            values["id"]: values
+            for values in self.env["tms.package"]
+            .browse(list(package_ids))
+            .read(
+                [
+                    "pickup_date",
+                    "forecast_unload_date",
+                    "shipping_origin_id",
+                    "shipping_destination_id",
+                ],
+                load=False,
+            )
+        }
+        existing = defaultdict(lambda: defaultdict(list))
+        for values in Checkpoint.search_read(
+            [("task_id", "in", self.ids), ("automatic", "=", True)],
+            [
+                "task_id",
+                "place_id",
+                "week",
+                "checkpoint_type",
+                "sequence",
+                "package_origin_ids",
+                "package_destination_ids",
+            ],
+            order="sequence, id",
+            load=False,
+        ):
+            key = (values["place_id"], values["week"], values["checkpoint_type"])
+            existing[values["task_id"]][key].append(values)
+        to_create = []
+        to_resequence = defaultdict(list)
+        to_write = []
+        for task_values in tasks_data:
+            task_existing = existing[task_values["id"]]
+            plan = self._get_checkpoints_plan(
+                task_values,
+                [packages_data[pid] for pid in task_values["tms_package_all_ids"]],
+            )
+            matched = []
+            for key, packages, seq in plan:
+                matches = task_existing.get(key)
+                if not matches:
+                    to_create.append(
+                        self.browse(task_values["id"])._prepare_checkpoint_vals(
+                            key, packages, seq
+                        )
+                    )
+                    continue
+                values = matches.pop(0)
+                matched.append((values, seq))
+                field_name = "package_{}_ids".format(key[2])
+                if set(values[field_name]) != set(packages):
+                    to_write.append((values["id"], {field_name: [(6, 0, packages)]}))
+            # Kept checkpoints take the plan sequences in their current order,
+            # so a route optimized or sorted by hand is not undone
+            for values, seq in zip(
+                sorted(
+                    (values for values, _seq in matched),
+                    key=lambda v: (v["sequence"], v["id"]),
+                ),
+                sorted(seq for _values, seq in matched),
+            ):
+                if values["sequence"] != seq:
+                    to_resequence[seq].append(values["id"])
+        to_unlink = [
+            values["id"]
+            for task_existing in existing.values()
+            for matches in task_existing.values()
+            for values in matches
+        ]
+        Checkpoint.browse(to_unlink).unlink()
+        for seq, checkpoint_ids in to_resequence.items():
+            Checkpoint.browse(checkpoint_ids).write({"sequence": seq})
+        for checkpoint_id, vals in to_write:
+            Checkpoint.browse(checkpoint_id).write(vals)
+        Checkpoint.create(to_create)
+        self.invalidate_cache(["checkpoint_ids"], self.ids)
+        if self.env["ir.config_parameter"].sudo().get_param("tms.route_optimize"):
+            self.optimize_checkpoints()
+        places_after = self._checkpoints_places()
+        return self.filtered(
+            lambda task: places_after[task.id] != places_before[task.id]
+        )
+
+    def optimize_checkpoints(self):
+        """Resequence checkpoints to reduce route distance keeping packages
+        pickup before delivery. First checkpoint is kept and also the last one
+        if it has no packages (task destination). Tasks with started
+        checkpoints are not changed.
+        """
+        Router = self.env["tms.router"]
         for task in self:
-            task.checkpoint_ids.filtered("automatic").unlink()
-            checkpoints_dic = defaultdict(list)
-            for orig_dest in ("origin", "destination"):
-                for package in task.tms_package_all_ids:
-                    key = task.get_checkpoint_key(package, orig_dest)
-                    if not key[0]:
-                        continue
-                    checkpoints_dic[key].append(package.id)
-            checkpoint_vals_list = []
-            seq = 0
-            init_place = task.release_id or task.shipping_origin_id
-            last_place = init_place
-            for key, packages in sorted(
-                checkpoints_dic.items(),
-                key=lambda kv: (0 if kv[0][2] == "origin" else 1, kv[0][1]),
+            checkpoints = task.checkpoint_ids.sorted(lambda c: (c.sequence, c.id))
+            places = checkpoints.mapped("place_id")
+            if (
+                len(checkpoints) < 4
+                or any(checkpoints.mapped("arrival_time"))
+                or not all(p.partner_latitude and p.partner_longitude for p in places)
             ):
-                # Add release_id or task origin as first checkpoint
-                if init_place and seq == 0 and key[0] != init_place:
-                    init_key = (init_place, None, "origin")
-                    checkpoint_vals_list.append(
-                        (0, 0, self._prepare_checkpoint_vals(init_key, [], seq))
-                    )
-                seq += 5
-                checkpoint_vals_list.append(
-                    (0, 0, self._prepare_checkpoint_vals(key, packages, seq))
-                )
-                last_place = key[0]
-            # Add acceptance_id checkpoint or task destination as last checkpoint
-            end_place = task.acceptance_id or task.shipping_destination_id
-            if end_place and end_place != last_place:
-                seq += 5
-                key = (end_place, None, "destination")
-                checkpoint_vals_list.append(
-                    (0, 0, self._prepare_checkpoint_vals(key, [], seq))
-                )
-            task.checkpoint_ids = checkpoint_vals_list
+                continue
+            places_matrix = Router.distance_matrix(places)
+            place_index = {place: i for i, place in enumerate(places)}
+            indexes = [place_index[cp.place_id] for cp in checkpoints]
+            matrix = [[places_matrix[i][j] for j in indexes] for i in indexes]
+            origin_index = {}
+            for i, checkpoint in enumerate(checkpoints):
+                for package in checkpoint.package_origin_ids:
+                    origin_index.setdefault(package, i)
+            precedences = [
+                (origin_index[package], i)
+                for i, checkpoint in enumerate(checkpoints)
+                for package in checkpoint.package_destination_ids
+                if package in origin_index
+            ]
+            last = checkpoints[-1]
+            route = optimize_route(
+                matrix,
+                precedences,
+                fix_end=not (last.package_origin_ids or last.package_destination_ids),
+            )
+            if route == list(range(len(checkpoints))):
+                continue
+            for position, i in enumerate(route):
+                checkpoints[i].sequence = position * 5
 
     def open_in_webmap(self):
         points_list = []
@@ -561,117 +1103,37 @@ class ProjectTask(models.Model):
         }
 
     def get_route_info(self):
-        google_map_api_key = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("base_geolocalize.google_map_api_key")
-        )
-        if google_map_api_key:
-            return self._get_route_googlemap()
-        return self._get_route_openrouteservice()
+        self.env["tms.router"].route_tasks(self)
 
-    def _get_route_googlemap(self):
-        google_key = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("base_geolocalize.google_map_api_key")
-        )
-        for task in self:
-            url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-            points_list = []
-            for line in task.checkpoint_ids:
-                latitude = line.place_id.partner_latitude
-                longitude = line.place_id.partner_longitude
-                if latitude and longitude:
-                    points_list.append("%s,%s" % (latitude, longitude))
-            params = {
-                "origins": "|".join(points_list[:-1]),
-                "destinations": "|".join(points_list[1:]),
-                "mode": "driving",
-                "language": self.env.lang,
-                "sensor": "false",
+    def _get_route_legs(self):
+        """Pairs of consecutive checkpoints with geolocated places
+        :return: list of (checkpoint, origin place, destination place)
+        """
+        self.ensure_one()
+        legs = []
+        previous_place = False
+        for checkpoint in self.checkpoint_ids:
+            place = checkpoint.place_id
+            if not (place.partner_latitude and place.partner_longitude):
+                continue
+            if previous_place:
+                legs.append((checkpoint, previous_place, place))
+            previous_place = place
+        return legs
+
+    def _update_route_info(self, legs, legs_values):
+        self.ensure_one()
+        total_distance = total_duration = 0.0
+        for checkpoint, origin, destination in legs:
+            distance, duration = legs_values[(origin.id, destination.id)]
+            checkpoint.update(
+                {"distance_estimated": distance, "duration_estimated": duration}
+            )
+            total_distance += distance
+            total_duration += duration
+        self.update(
+            {
+                "distance_estimated": total_distance,
+                "planned_hours": total_duration,
             }
-            if google_key:
-                params.update({"key": google_key})
-            try:
-                # TODO: test after change simplejson to json
-                result = json.loads(requests.get(url, params=params).content)
-                total_distance = total_duration = 0.0
-                if result["status"] != "OK":
-                    task.update({"distance_estimated": 0.0, "planned_hours": 0.0})
-                    return
-                for i, checkpoint in enumerate(task.checkpoint_ids[1:]):
-                    distance = (
-                        result["rows"][i]["elements"][i]["distance"]["value"] / 1000.0
-                    )
-                    duration = (
-                        result["rows"][i]["elements"][i]["duration"]["value"] / 3600.0
-                    )
-                    checkpoint.update(
-                        {"distance_estimated": distance, "duration_estimated": duration}
-                    )
-                    total_distance += distance
-                    total_duration += duration
-                task.update(
-                    {
-                        "distance_estimated": total_distance,
-                        "planned_hours": total_duration,
-                    }
-                )
-            except Exception as err:
-                raise exceptions.UserError(
-                    _("Google Maps is not available: %s") % str(err)
-                ) from err
-
-    def _get_route_openrouteservice(self):
-        # TODO: Change to company field
-        token = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("base_geolocalize.openrouteservice_api_key")
         )
-        headers = {
-            "Accept": "application/json, application/geo+json, "
-            "application/gpx+xml, img/png; charset=utf-8",
-            "Authorization": token,
-            "Content-Type": "application/json; charset=utf-8",
-        }
-        url = "https://api.openrouteservice.org/v2/matrix/driving-hgv"
-        for task in self:
-            points_list = []
-            for line in task.checkpoint_ids:
-                latitude = line.place_id.partner_latitude
-                longitude = line.place_id.partner_longitude
-                if latitude and longitude:
-                    points_list.append([longitude, latitude])
-            body = {
-                "locations": points_list,
-                "destinations": list(range(1, len(points_list))),
-                "id": str(task.id),
-                "metrics": ["distance", "duration"],
-                "units": "km",
-            }
-            response = requests.post(url, json=body, headers=headers)
-            if response.status_code != 200:
-                _logger.error(
-                    "Request to openrouteservice failed.\nCode: %s\nContent: %s"
-                    % (response.status_code, response.content)
-                )
-                task.update({"distance_estimated": 0.0, "planned_hours": 0.0})
-                return
-            result = response.json()
-            total_distance = total_duration = 0.0
-            for i, checkpoint in enumerate(task.checkpoint_ids[1:]):
-                distance = result["distances"][i][i]
-                duration = result["durations"][i][i] / 3600.0
-                checkpoint.update(
-                    {"distance_estimated": distance, "duration_estimated": duration}
-                )
-                total_distance += distance
-                total_duration += duration
-            task.update(
-                {
-                    "distance_estimated": total_distance,
-                    "planned_hours": total_duration,
-                }
-            )
@@ -2,6 +2,8 @@
 # Copyright 2017 Carlos Dauden <carlos.dauden@tecnativa.com>
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
+
 from odoo import api, fields, models
 
 
@@ -21,6 +23,13 @@ class ProjectTaskCheckpoint(models.Model):
     )
     sequence = fields.Integer()
     automatic = fields.Boolean()
+    week = fields.Char(
+        help="Calendar week of packages grouped in automatic checkpoint",
+    )
+    checkpoint_type = fields.Selection(
+        [("origin", "Origin"), ("destination", "Destination")],
+        string="Type",
+    )
     place_id = fields.Many2one(
         comodel_name="res.partner",
         domain=[("is_shipping_place", "=", True)],
@@ -66,6 +75,72 @@ class ProjectTaskCheckpoint(models.Model):
                 checkpoint.departure_time - checkpoint.arrival_time
             ).total_seconds() / 3600
 
+    @api.model
+    def _fill_missing_keys(self):
+        """Set type and week of automatic checkpoints created before they were
+        stored, so fill_checkpoints matches them instead of recreating them
+        """
+        checkpoints = self.search(
+            [("automatic", "=", True), ("checkpoint_type", "=", False)]
+        )
+        checkpoint_ids_map = defaultdict(list)
+        for checkpoint in checkpoints:
+            task = checkpoint.task_id
+            if checkpoint.package_origin_ids:
+                checkpoint_type = "origin"
+                package = checkpoint.package_origin_ids[:1]
+            elif checkpoint.package_destination_ids:
+                checkpoint_type = "destination"
+                package = checkpoint.package_destination_ids[:1]
+            else:
+                # Task initial or final place without packages
+                init_place = task.release_id or task.shipping_origin_id
+                checkpoint_type = (
+                    "origin" if checkpoint.place_id == init_place else "destination"
+                )
+                package = False
+            week = False
+            if package:
+                date = package.pickup_date or fields.datetime.max
+                if checkpoint_type == "destination" and package.forecast_unload_date:
+                    date = package.forecast_unload_date
+                week = date.strftime("%Y%W")
+            checkpoint_ids_map[(checkpoint_type, week)].append(checkpoint.id)
+        for (checkpoint_type, week), checkpoint_ids in checkpoint_ids_map.items():
+            self.browse(checkpoint_ids).write(
+                {"checkpoint_type": checkpoint_type, "week": week}
+            )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        checkpoints = super().create(vals_list)
+        self.env["fleet.vehicle"]._invalidate_workload()
+        checkpoints.mapped("task_id")._mark_workload_dirty()
+        checkpoints.mapped("task_id")._enqueue_route_job()
+        return checkpoints
+
+    def write(self, vals):
+        tasks = self.mapped("task_id")
+        res = super().write(vals)
+        self.env["fleet.vehicle"]._invalidate_workload()
+        if any(
+            field in vals
+            for field in ("duration_estimated", "departure_time", "task_id")
+        ):
+            (tasks | self.mapped("task_id"))._mark_workload_dirty()
+        if "place_id" in vals or "sequence" in vals or "task_id" in vals:
+            (tasks | self.mapped("task_id"))._enqueue_route_job()
+        return res
+
+    def unlink(self):
+        tasks = self.mapped("task_id")
+        res = super().unlink()
+        self.env["fleet.vehicle"]._invalidate_workload()
+        tasks = tasks.exists()
+        tasks._mark_workload_dirty()
+        tasks._enqueue_route_job()
+        return res
+
     def register_arrival_time(self):
         self.ensure_one()
         self.arrival_time = fields.Datetime.now()
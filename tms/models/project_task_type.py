@@ -0,0 +1,27 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import models
+
+
+class ProjectTaskType(models.Model):
+    _inherit = "project.task.type"
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "is_closed" in vals or "sequence" in vals:
+            self.env["fleet.vehicle"]._invalidate_workload()
+        if "is_closed" in vals and self.ids:
+            self.flush(["is_closed"])
+            self.env.cr.execute(
+                """
+                SELECT tractor_id, trailer_id FROM project_task
+                WHERE stage_id IN %s
+                    AND (tractor_id IS NOT NULL OR trailer_id IS NOT NULL)
+                """,
+                (tuple(self.ids),),
+            )
+            self.env["fleet.vehicle.workload"]._mark_dirty(
+                {vehicle_id for row in self.env.cr.fetchall() for vehicle_id in row}
+            )
+        return res
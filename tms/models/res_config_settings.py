@@ -21,3 +21,58 @@ class ResConfigSettings(models.TransientModel):
         config_parameter="base_geolocalize.openrouteservice_api_key",
         help="Visit https://openrouteservice.org/services/ for more information.",
     )
+    route_leg_cache_ttl = fields.Integer(
+        string="Route Cache Days",
+        config_parameter="tms.route_leg_cache_ttl",
+        default=30,
+        help="Days to keep distance and duration between places without asking "
+        "again to route provider.",
+    )
+    route_request_mode = fields.Selection(
+        selection=[
+            ("matrix", "Distance matrix"),
+            ("legs", "Consecutive legs"),
+        ],
+        string="Route Request Mode",
+        config_parameter="tms.route_request_mode",
+        default="matrix",
+        help="Distance matrix groups requests of several tasks. Consecutive legs "
+        "asks only for the route between consecutive checkpoints of each task.",
+    )
+    route_geometry = fields.Boolean(
+        string="Store Route Geometry",
+        config_parameter="tms.route_geometry",
+        help="Only available with consecutive legs mode.",
+    )
+    route_max_workers = fields.Integer(
+        string="Route Concurrent Requests",
+        config_parameter="tms.route_max_workers",
+        default=1,
+        help="Number of requests sent at the same time to route provider.",
+    )
+    route_offline_fallback = fields.Boolean(
+        string="Offline Route Fallback",
+        config_parameter="tms.route_offline_fallback",
+        help="Estimate route from great circle distance when route provider is "
+        "not configured or fails.",
+    )
+    route_circuity_factor = fields.Float(
+        string="Route Circuity Factor",
+        config_parameter="tms.route_circuity_factor",
+        default=1.3,
+        help="Ratio between road and great circle distance for offline route "
+        "estimation.",
+    )
+    route_average_speed = fields.Float(
+        string="Average Speed (km/h)",
+        config_parameter="tms.route_average_speed",
+        default=70.0,
+        help="Used for offline route estimation when tractor model has not "
+        "average speed.",
+    )
+    route_optimize = fields.Boolean(
+        string="Optimize Checkpoints Order",
+        config_parameter="tms.route_optimize",
+        help="Resequence automatic checkpoints to reduce route distance keeping "
+        "pickups before deliveries.",
+    )
@@ -29,6 +29,20 @@ class ResPartner(models.Model):
             return self.name or self.commercial_company_name
         return super()._get_name()
 
+    def write(self, vals):
+        res = super().write(vals)
+        if "partner_latitude" in vals or "partner_longitude" in vals:
+            self.env["tms.route.leg"].invalidate_places(self)
+            self.env["project.task"].search(
+                [
+                    ("checkpoint_ids.place_id", "in", self.ids),
+                    "|",
+                    ("stage_id", "=", False),
+                    ("stage_id.is_closed", "=", False),
+                ]
+            )._enqueue_route_job()
+        return res
+
 
 # TODO: Use OCA modules
 class ResPartnerZone(models.Model):
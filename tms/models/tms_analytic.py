@@ -55,16 +55,34 @@ class TmsAnalytic(models.AbstractModel):
                 vals[field] = value
         return vals
 
+    @api.model
+    def _get_driver_vendor(self, driver):
+        """Driver company as vendor if it is not one of my companies"""
+        commercial_partner = driver.commercial_partner_id
+        if self.env.company not in commercial_partner.ref_company_ids:
+            return commercial_partner.id
+        return False
+
+    @api.model
+    def _get_tractor_vals(self, tractor):
+        """Values set by tractor and driver onchange methods"""
+        vals = {"tractor_id": tractor.id}
+        driver = self.env["res.partner"]
+        if not self.env.context.get("skip_tractor_onchange"):
+            driver = tractor.driver_id
+            vals.update({"trailer_id": tractor.trailer_id.id, "driver_id": driver.id})
+        if "vendor_id" in self._fields and not self.env.context.get(
+            "skip_driver_onchange"
+        ):
+            # Vendor is reset when driver is not set from tractor
+            vals["vendor_id"] = self._get_driver_vendor(driver)
+        return vals
+
     @api.onchange("tractor_id")
     def _onchange_tractor_id(self):
         if self.env.context.get("skip_tractor_onchange"):
             return
-        self.update(
-            {
-                "trailer_id": self.tractor_id.trailer_id.id,
-                "driver_id": self.tractor_id.driver_id.id,
-            }
-        )
+        self.update(self._get_tractor_vals(self.tractor_id))
 
     @api.onchange("driver_id")
     def _onchange_driver_id(self):
@@ -74,9 +92,4 @@ class TmsAnalytic(models.AbstractModel):
         ):
             return
         # Evaluate if driver is from my company or other to assign as vendor
-        commercial_partner = self.driver_id.commercial_partner_id
-        self.vendor_id = (
-            commercial_partner
-            if self.env.company not in commercial_partner.ref_company_ids
-            else False
-        )
+        self.vendor_id = self._get_driver_vendor(self.driver_id)
@@ -128,36 +128,277 @@ class TmsPackage(models.Model):
         "checkpoint_origin_ids",
         "checkpoint_origin_ids.departure_time",
         "checkpoint_origin_ids.arrival_time",
-        "task_ids.timesheet_ids",
         "task_ids.stage_id.is_closed",
     )
     def _compute_state(self):
+        # Timesheets changes are notified by account.analytic.line, only when
+        # a task gets its first timesheet or loses its last one
+        flags_map = self.filtered("id")._get_state_flags_map()
         for package in self:
-            if not package.task_ids:
-                package.state = "draft"
-            elif any(package.checkpoint_destination_ids.mapped("departure_time")):
-                package.state = "done"
-            elif any(package.checkpoint_destination_ids.mapped("arrival_time")):
-                package.state = "unloading"
-            elif any(package.checkpoint_origin_ids.mapped("departure_time")):
-                package.state = "transit"
-            elif any(package.checkpoint_origin_ids.mapped("arrival_time")):
-                package.state = "loading"
-            elif any(package.task_ids.mapped("timesheet_ids")):
-                package.state = "progress"
-            elif package.checkpoint_origin_ids and package.checkpoint_destination_ids:
-                package.state = "ready"
-            # TODO: Find better cancel state check
-            elif all(package.task_ids.mapped("stage_id.is_closed")):
-                package.state = "cancel"
-            else:
-                package.state = "pending"
+            flags = flags_map.get(package.id) or package._get_state_flags()
+            package.state = self._get_state_from_flags(flags)
+
+    def _write(self, vals):
+        """Log state transitions when they are stored, so intermediate or
+        onchange computed states are not logged
+        """
+        if "state" not in vals or not self:
+            return super()._write(vals)
+        self.env.cr.execute(
+            "SELECT id, state FROM tms_package WHERE id IN %s", (tuple(self.ids),)
+        )
+        previous_states = dict(self.env.cr.fetchall())
+        res = super()._write(vals)
+        transitions = [
+            (package, previous_states.get(package.id), vals["state"])
+            for package in self
+            if previous_states.get(package.id) != vals["state"]
+        ]
+        if transitions:
+            self.env["tms.package.state.log"].sudo().create(
+                [
+                    self._prepare_state_log_vals(*transition)
+                    for transition in transitions
+                ]
+            )
+        return res
+
+    @api.model
+    def _prepare_state_log_vals(self, package, previous_state, state):
+        """Transition values with the checkpoint that caused it"""
+        checkpoint = self.env["project.task.checkpoint"]
+        date = False
+        if state in ("loading", "transit", "unloading", "done"):
+            orig_dest = "destination" if state in ("unloading", "done") else "origin"
+            time_field = (
+                "departure_time" if state in ("transit", "done") else "arrival_time"
+            )
+            checkpoint = (
+                package["checkpoint_{}_ids".format(orig_dest)]
+                .filtered(time_field)
+                .sorted(time_field)[-1:]
+            )
+            date = checkpoint[time_field]
+        task = checkpoint.task_id or package.task_ids[:1]
+        return {
+            "package_id": package.id,
+            "previous_state": previous_state,
+            "state": state,
+            "date": date or fields.Datetime.now(),
+            "task_id": task.id,
+            "checkpoint_id": checkpoint.id,
+            "place_id": checkpoint.place_id.id,
+            "partner_id": package.partner_id.id,
+        }
+
+    @api.model
+    def _get_state_from_flags(self, flags):
+        if not flags["has_tasks"]:
+            return "draft"
+        elif flags["destination_departure"]:
+            return "done"
+        elif flags["destination_arrival"]:
+            return "unloading"
+        elif flags["origin_departure"]:
+            return "transit"
+        elif flags["origin_arrival"]:
+            return "loading"
+        elif flags["has_timesheets"]:
+            return "progress"
+        elif flags["has_origin"] and flags["has_destination"]:
+            return "ready"
+        # TODO: Find better cancel state check
+        elif flags["tasks_closed"]:
+            return "cancel"
+        return "pending"
+
+    def _get_state_flags(self):
+        """State flags from records, used for new records"""
+        self.ensure_one()
+        return {
+            "has_tasks": bool(self.task_ids),
+            "destination_departure": any(
+                self.checkpoint_destination_ids.mapped("departure_time")
+            ),
+            "destination_arrival": any(
+                self.checkpoint_destination_ids.mapped("arrival_time")
+            ),
+            "origin_departure": any(
+                self.checkpoint_origin_ids.mapped("departure_time")
+            ),
+            "origin_arrival": any(self.checkpoint_origin_ids.mapped("arrival_time")),
+            "has_timesheets": any(self.task_ids.mapped("timesheet_ids")),
+            "has_origin": bool(self.checkpoint_origin_ids),
+            "has_destination": bool(self.checkpoint_destination_ids),
+            "tasks_closed": all(self.task_ids.mapped("stage_id.is_closed")),
+        }
+
+    def _get_state_flags_map(self):
+        """State flags of packages with aggregate queries
+        :return: dict with package id as key and flags dict as value
+        """
+        if not self:
+            return {}
+        self.flush(["checkpoint_origin_ids", "checkpoint_destination_ids", "task_ids"])
+        self.env["project.task.checkpoint"].flush(["arrival_time", "departure_time"])
+        self.env["project.task"].flush(["stage_id", "active"])
+        self.env["project.task.type"].flush(["is_closed"])
+        self.env["account.analytic.line"].flush(["task_id"])
+        flags_map = {
+            package_id: {
+                "has_tasks": False,
+                "destination_departure": False,
+                "destination_arrival": False,
+                "origin_departure": False,
+                "origin_arrival": False,
+                "has_timesheets": False,
+                "has_origin": False,
+                "has_destination": False,
+                "tasks_closed": True,
+            }
+            for package_id in self.ids
+        }
+        ids = tuple(self.ids)
+        for orig_dest in ("origin", "destination"):
+            self.env.cr.execute(
+                """
+                SELECT rel.package_id,
+                    bool_or(cp.departure_time IS NOT NULL),
+                    bool_or(cp.arrival_time IS NOT NULL)
+                FROM project_task_checkpoint_tms_package_{}_rel rel
+                JOIN project_task_checkpoint cp ON cp.id = rel.checkpoint_id
+                WHERE rel.package_id IN %s
+                GROUP BY rel.package_id
+                """.format(
+                    orig_dest
+                ),
+                (ids,),
+            )
+            for package_id, departure, arrival in self.env.cr.fetchall():
+                flags_map[package_id].update(
+                    {
+                        "has_{}".format(orig_dest): True,
+                        "{}_departure".format(orig_dest): departure,
+                        "{}_arrival".format(orig_dest): arrival,
+                    }
+                )
+        # Tasks without stage are not evaluated to get closed tasks
+        self.env.cr.execute(
+            """
+            SELECT rel.tms_package_id,
+                bool_or(EXISTS(
+                    SELECT 1 FROM account_analytic_line aal
+                    WHERE aal.task_id = task.id
+                )),
+                COALESCE(
+                    bool_and(COALESCE(stage.is_closed, FALSE))
+                        FILTER (WHERE stage.id IS NOT NULL),
+                    TRUE
+                )
+            FROM project_task_tms_package_rel rel
+            JOIN project_task task ON task.id = rel.project_task_id
+            LEFT JOIN project_task_type stage ON stage.id = task.stage_id
+            WHERE rel.tms_package_id IN %s AND task.active
+            GROUP BY rel.tms_package_id
+            """,
+            (ids,),
+        )
+        for package_id, has_timesheets, tasks_closed in self.env.cr.fetchall():
+            flags_map[package_id].update(
+                {
+                    "has_tasks": True,
+                    "has_timesheets": has_timesheets,
+                    "tasks_closed": tasks_closed,
+                }
+            )
+        return flags_map
+
+    @api.model
+    def recompute_all_states(self, chunk_size=1000, auto_commit=False):
+        """Recompute state of all packages in chunks, e.g. from shell:
+        env["tms.package"].recompute_all_states(auto_commit=True)
+        """
+        self.env.cr.execute("SELECT id FROM tms_package ORDER BY id")
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        field = self._fields["state"]
+        for index in range(0, len(ids), chunk_size):
+            packages = self.browse(ids[index : index + chunk_size])
+            self.env.add_to_compute(field, packages)
+            self.recompute(["state"], packages)
+            packages.flush(["state"])
+            if auto_commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+            self.invalidate_cache(ids=packages.ids)
+        return len(ids)
+
+    @api.model
+    def _route_job_fields(self):
+        """Fields that change task automatic checkpoints"""
+        return [
+            "pickup_date",
+            "forecast_unload_date",
+            "shipping_origin_id",
+            "shipping_destination_id",
+            "sequence",
+            "task_ids",
+        ]
+
+    def write(self, vals):
+        tasks = self.mapped("task_ids")
+        res = super().write(vals)
+        if any(field in vals for field in self._route_job_fields()):
+            (tasks | self.mapped("task_ids"))._enqueue_route_job(fill_checkpoints=True)
+        return res
+
+    @api.model
+    def _next_names(self, count):
+        """Reserve count numbers of package sequence at once. Standard
+        sequences get all values in one nextval query and no gap ones are
+        increased once. Sequences with date ranges are requested one by one.
+        """
+        IrSequence = self.env["ir.sequence"]
+        IrSequence.check_access_rights("read")
+        sequence = IrSequence.search(
+            [
+                ("code", "=", "tms.package"),
+                ("company_id", "in", [self.env.company.id, False]),
+            ],
+            order="company_id",
+            limit=1,
+        )
+        if not sequence:
+            return [False] * count
+        if count == 1 or sequence.use_date_range:
+            return [sequence._next() for _i in range(count)]
+        if sequence.implementation == "standard":
+            self.env.cr.execute(
+                "SELECT nextval('ir_sequence_%03d') FROM generate_series(1, %%s)"
+                % sequence.id,
+                (count,),
+            )
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            sequence.flush(["number_next"])
+            self.env.cr.execute(
+                "SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT",
+                (sequence.id,),
+            )
+            number_next = self.env.cr.fetchone()[0]
+            self.env.cr.execute(
+                "UPDATE ir_sequence SET number_next = number_next + %s WHERE id = %s",
+                (sequence.number_increment * count, sequence.id),
+            )
+            sequence.invalidate_cache(["number_next"], sequence.ids)
+            numbers = [
+                number_next + i * sequence.number_increment for i in range(count)
+            ]
+        return [sequence.get_next_char(number) for number in numbers]
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if "name" in vals and vals["name"] == "/":
-                vals["name"] = (
-                    self.env["ir.sequence"].next_by_code("tms.package") or "/"
-                )
+        new_vals_list = [vals for vals in vals_list if vals.get("name") == "/"]
+        if new_vals_list:
+            names = self._next_names(len(new_vals_list))
+            for vals, name in zip(new_vals_list, names):
+                vals["name"] = name or "/"
         return super().create(vals_list)
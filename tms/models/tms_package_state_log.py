@@ -0,0 +1,108 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+from odoo import api, fields, models
+
+
+class TmsPackageStateLog(models.Model):
+    """Append only log of package state transitions"""
+
+    _name = "tms.package.state.log"
+    _description = "TMS Package State Log"
+    _order = "date DESC, id DESC"
+    _log_access = False
+
+    package_id = fields.Many2one(
+        comodel_name="tms.package",
+        string="Package",
+        required=True,
+        ondelete="cascade",
+        readonly=True,
+    )
+    state = fields.Selection(
+        selection=lambda self: self.env["tms.package"]._fields["state"].selection,
+        required=True,
+        readonly=True,
+    )
+    previous_state = fields.Selection(
+        selection=lambda self: self.env["tms.package"]._fields["state"].selection,
+        readonly=True,
+    )
+    date = fields.Datetime(required=True, index=True, readonly=True)
+    task_id = fields.Many2one(
+        comodel_name="project.task",
+        string="Task",
+        ondelete="set null",
+        readonly=True,
+    )
+    checkpoint_id = fields.Many2one(
+        comodel_name="project.task.checkpoint",
+        string="Checkpoint",
+        ondelete="set null",
+        readonly=True,
+    )
+    place_id = fields.Many2one(
+        comodel_name="res.partner",
+        string="Place",
+        index=True,
+        readonly=True,
+    )
+    partner_id = fields.Many2one(
+        comodel_name="res.partner",
+        string="Customer",
+        index=True,
+        readonly=True,
+    )
+
+    def init(self):
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS tms_package_state_log_package_date_idx
+            ON tms_package_state_log (package_id, date)
+            """
+        )
+
+    @api.model
+    def _get_kpi_group_columns(self):
+        return {
+            "place": "place_id",
+            "customer": "partner_id",
+            "state": "NULL",
+        }
+
+    @api.model
+    def get_state_kpis(self, date_from, date_to, group_by="place"):
+        """Throughput and dwell time of transitions between dates
+        :param group_by: place, customer or state
+        :return: list of dicts with group id, ISO week, state, number of
+                 transitions and average hours until next transition
+        """
+        group_column = self._get_kpi_group_columns()[group_by]
+        self.flush()
+        self.env.cr.execute(
+            """
+            WITH state_log AS (
+                SELECT log.*, LEAD(log.date) OVER (
+                    PARTITION BY log.package_id ORDER BY log.date, log.id
+                ) AS next_date
+                FROM tms_package_state_log log
+                WHERE log.package_id IN (
+                    SELECT package_id FROM tms_package_state_log
+                    WHERE date >= %(date_from)s AND date < %(date_to)s
+                )
+            )
+            SELECT {group_column} AS group_id,
+                to_char(date, 'IYYY-IW') AS week,
+                state,
+                COUNT(*) AS transitions,
+                AVG(EXTRACT(EPOCH FROM next_date - date)) / 3600.0 AS dwell_hours
+            FROM state_log
+            WHERE date >= %(date_from)s AND date < %(date_to)s
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+            """.format(
+                group_column=group_column
+            ),
+            {"date_from": date_from, "date_to": date_to},
+        )
+        return self.env.cr.dictfetchall()
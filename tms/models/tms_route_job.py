@@ -0,0 +1,233 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITY = 10
+
+
+class TmsRouteJob(models.Model):
+    """Pending checkpoints fill and route estimation of a task.
+
+    There is only one pending job for each task, enqueuing it again merges the
+    options and keeps the highest priority (lowest value). Jobs are taken by a
+    cron in batches with SKIP LOCKED, so several workers can process the queue
+    at the same time, and marked as started before processing them. Changes
+    made while a job is running enqueue a new pending job for the task.
+    """
+
+    _name = "tms.route.job"
+    _description = "TMS Route Job"
+    _order = "priority, id"
+
+    task_id = fields.Many2one(
+        comodel_name="project.task",
+        string="Task",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    state = fields.Selection(
+        [
+            ("pending", "Pending"),
+            ("started", "Started"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        default="pending",
+        required=True,
+        index=True,
+    )
+    priority = fields.Integer(default=DEFAULT_PRIORITY)
+    fill_checkpoints = fields.Boolean(
+        help="Fill task checkpoints before estimating route",
+    )
+    attempts = fields.Integer()
+    date_started = fields.Datetime(string="Started")
+    date_done = fields.Datetime(string="Done")
+    duration = fields.Float(help="Seconds spent processing the batch of the job")
+    error = fields.Text()
+
+    def init(self):
+        self.env.cr.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS tms_route_job_pending_task_uniq
+            ON tms_route_job (task_id) WHERE state = 'pending'
+            """
+        )
+
+    @api.model
+    def enqueue(self, tasks, fill_checkpoints=False, priority=DEFAULT_PRIORITY):
+        """Add tasks to queue merging them with their pending jobs"""
+        if not tasks or self.env.context.get("tms_route_job_skip"):
+            return self.browse()
+        self.flush()
+        # Insert or merge in one statement, concurrent enqueues of the same
+        # task do not conflict and running jobs are not waited for
+        self.env.cr.execute(
+            """
+            INSERT INTO tms_route_job (
+                task_id, state, priority, fill_checkpoints, attempts,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT task_id, 'pending', %(priority)s, %(fill_checkpoints)s, 0,
+                %(uid)s, NOW() AT TIME ZONE 'UTC',
+                %(uid)s, NOW() AT TIME ZONE 'UTC'
+            FROM unnest(%(task_ids)s) AS task_id
+            ON CONFLICT (task_id) WHERE state = 'pending' DO UPDATE SET
+                fill_checkpoints = (
+                    tms_route_job.fill_checkpoints OR EXCLUDED.fill_checkpoints
+                ),
+                priority = LEAST(tms_route_job.priority, EXCLUDED.priority),
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+            RETURNING id
+            """,
+            {
+                "task_ids": list(tasks.ids),
+                "priority": priority,
+                "fill_checkpoints": bool(fill_checkpoints),
+                "uid": self.env.uid,
+            },
+        )
+        job_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_cache(ids=job_ids)
+        return self.browse(job_ids)
+
+    @api.model
+    def _start_pending_jobs(self, limit):
+        """Mark next pending jobs as started skipping the ones locked by
+        other workers
+        """
+        self.flush()
+        self.env.cr.execute(
+            """
+            UPDATE tms_route_job
+            SET state = 'started', date_started = NOW() AT TIME ZONE 'UTC'
+            WHERE id IN (
+                SELECT id FROM tms_route_job
+                WHERE state = 'pending'
+                ORDER BY priority, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+            """,
+            (limit,),
+        )
+        job_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_cache(ids=job_ids)
+        return self.browse(job_ids).sorted(lambda j: (j.priority, j.id))
+
+    @api.model
+    def _fail_stale_jobs(self, time_limit):
+        """Started jobs of interrupted workers are failed and enqueued again"""
+        jobs = self.search(
+            [
+                ("state", "=", "started"),
+                (
+                    "date_started",
+                    "<",
+                    fields.Datetime.now() - timedelta(seconds=2 * time_limit),
+                ),
+            ]
+        )
+        jobs.write({"state": "failed", "error": "Interrupted"})
+        for job in jobs:
+            self.enqueue(job.task_id, job.fill_checkpoints, job.priority)
+
+    @api.model
+    def _process_jobs(self, limit=None, auto_commit=False):
+        """Process pending jobs in batches until queue is empty or the time
+        limit is reached.
+        :param limit: Maximum number of jobs to process
+        :param auto_commit: Commit after each batch, used from cron
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        batch_size = int(ICP.get_param("tms.route_job_batch_size", 100))
+        time_limit = float(ICP.get_param("tms.route_job_time_limit", 240.0))
+        deadline = time.monotonic() + time_limit
+        processed = 0
+        self._fail_stale_jobs(time_limit)
+        while time.monotonic() < deadline:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            if size <= 0:
+                break
+            jobs = self._start_pending_jobs(size)
+            if not jobs:
+                break
+            if auto_commit:
+                # Release the rows, changes made from now on enqueue new jobs
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+            jobs._process()
+            processed += len(jobs)
+            if auto_commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+        return processed
+
+    def _process(self):
+        """Process jobs in batch. If it fails each job is processed alone to
+        isolate the failing ones.
+        """
+        start = time.monotonic()
+        try:
+            with self.env.cr.savepoint():
+                self._run()
+        except Exception:
+            if len(self) == 1:
+                _logger.exception("Route job %s failed", self.id)
+                self.write(
+                    {
+                        "state": "failed",
+                        "attempts": self.attempts + 1,
+                        "date_done": fields.Datetime.now(),
+                        "duration": time.monotonic() - start,
+                        "error": traceback.format_exc(),
+                    }
+                )
+                return
+            for job in self:
+                job._process()
+            return
+        for job in self:
+            job.attempts += 1
+        self.write(
+            {
+                "state": "done",
+                "date_done": fields.Datetime.now(),
+                "duration": time.monotonic() - start,
+                "error": False,
+            }
+        )
+
+    def _run(self):
+        # Avoid enqueuing again the tasks changed while processing
+        jobs = self.with_context(tms_route_job_skip=True)
+        jobs.filtered("fill_checkpoints").mapped("task_id").fill_checkpoints()
+        # Legs not changed are served from route legs cache
+        jobs.mapped("task_id").get_route_info()
+
+    def action_retry(self):
+        for job in self.filtered(lambda j: j.state == "failed"):
+            self.enqueue(job.task_id, job.fill_checkpoints, job.priority)
+
+    @api.autovacuum
+    def _gc_done_jobs(self):
+        days = int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("tms.route_job_keep_days", 7)
+        )
+        self.sudo().search(
+            [
+                ("state", "=", "done"),
+                ("date_done", "<", fields.Datetime.now() - timedelta(days=days)),
+            ]
+        ).unlink()
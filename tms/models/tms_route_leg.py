@@ -0,0 +1,154 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import hashlib
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+DEFAULT_ROUTE_LEG_TTL = 30
+
+
+class TmsRouteLeg(models.Model):
+    """Cache of distance and duration between two shipping places"""
+
+    _name = "tms.route.leg"
+    _description = "TMS Route Leg"
+
+    origin_id = fields.Many2one(
+        comodel_name="res.partner",
+        string="Origin",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    destination_id = fields.Many2one(
+        comodel_name="res.partner",
+        string="Destination",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    provider = fields.Char(required=True)
+    profile = fields.Char(required=True)
+    coordinates_hash = fields.Char(required=True)
+    distance = fields.Float(digits="TMS Distance")
+    duration = fields.Float()
+
+    _sql_constraints = [
+        (
+            "leg_unique",
+            "unique(origin_id, destination_id, provider, profile)",
+            "Route leg already exists for this provider and profile!",
+        ),
+    ]
+
+    @api.model
+    def _coordinates_hash(self, origin, destination):
+        coords = "%.6f,%.6f;%.6f,%.6f" % (
+            origin.partner_latitude,
+            origin.partner_longitude,
+            destination.partner_latitude,
+            destination.partner_longitude,
+        )
+        return hashlib.sha1(coords.encode()).hexdigest()
+
+    @api.model
+    def _get_expiration_date(self):
+        ttl = int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("tms.route_leg_cache_ttl", DEFAULT_ROUTE_LEG_TTL)
+        )
+        return fields.Datetime.now() - timedelta(days=ttl)
+
+    @api.model
+    def get_legs(self, place_pairs, provider, profile):
+        """Get cached legs not expired and with the same coordinates
+        :param place_pairs: list of (origin, destination) partner records
+        :return: dict with (origin_id, destination_id) as key and
+                 (distance, duration) as value
+        """
+        if not place_pairs:
+            return {}
+        legs = self.sudo().search(
+            [
+                ("origin_id", "in", list({p[0].id for p in place_pairs})),
+                ("destination_id", "in", list({p[1].id for p in place_pairs})),
+                ("provider", "=", provider),
+                ("profile", "=", profile),
+                ("write_date", ">=", self._get_expiration_date()),
+            ]
+        )
+        legs_dic = {(leg.origin_id.id, leg.destination_id.id): leg for leg in legs}
+        res = {}
+        for origin, destination in place_pairs:
+            key = (origin.id, destination.id)
+            leg = legs_dic.get(key)
+            if leg and leg.coordinates_hash == self._coordinates_hash(
+                origin, destination
+            ):
+                res[key] = (leg.distance, leg.duration)
+        return res
+
+    @api.model
+    def set_legs(self, place_pairs, legs_values, provider, profile):
+        """Store legs obtained from provider
+        :param place_pairs: list of (origin, destination) partner records
+        :param legs_values: dict with (origin_id, destination_id) as key and
+                            (distance, duration) as value
+        """
+        place_pairs = {
+            (pair[0].id, pair[1].id): pair
+            for pair in place_pairs
+            if (pair[0].id, pair[1].id) in legs_values
+        }
+        if not place_pairs:
+            return
+        RouteLeg = self.sudo()
+        legs = RouteLeg.search(
+            [
+                ("origin_id", "in", list({k[0] for k in place_pairs})),
+                ("destination_id", "in", list({k[1] for k in place_pairs})),
+                ("provider", "=", provider),
+                ("profile", "=", profile),
+            ]
+        )
+        legs_dic = {(leg.origin_id.id, leg.destination_id.id): leg for leg in legs}
+        vals_list = []
+        for key, (origin, destination) in place_pairs.items():
+            distance, duration = legs_values[key]
+            vals = {
+                "coordinates_hash": self._coordinates_hash(origin, destination),
+                "distance": distance,
+                "duration": duration,
+            }
+            if key in legs_dic:
+                legs_dic[key].write(vals)
+                continue
+            vals.update(
+                {
+                    "origin_id": origin.id,
+                    "destination_id": destination.id,
+                    "provider": provider,
+                    "profile": profile,
+                }
+            )
+            vals_list.append(vals)
+        if vals_list:
+            RouteLeg.create(vals_list)
+
+    @api.model
+    def invalidate_places(self, places):
+        """Remove cached legs of places whose coordinates have changed"""
+        self.sudo().search(
+            [
+                "|",
+                ("origin_id", "in", places.ids),
+                ("destination_id", "in", places.ids),
+            ]
+        ).unlink()
+
+    @api.autovacuum
+    def _gc_expired_legs(self):
+        self.sudo().search([("write_date", "<", self._get_expiration_date())]).unlink()
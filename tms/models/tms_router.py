@@ -0,0 +1,615 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import logging
+from collections import defaultdict
+from functools import partial
+
+from odoo import api, models
+
+from ..tools.route_geo import haversine_km
+from ..tools.route_http import route_request
+from ..tools.route_pool import get_rate_limiter, run_concurrently
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_AVERAGE_SPEED = 70.0
+
+
+class TmsRouter(models.AbstractModel):
+    """Route estimation for tasks checkpoints.
+
+    Route providers are identified by the tech_name of base.geo_provider and
+    registered in _get_route_providers. Each provider implements
+    _call_<tech_name>(runs, with_geometry) where runs is a list of dicts with
+    the task and the coordinates (latitude, longitude) of consecutive places
+    to route. It returns for each run a tuple with a list of (distance in km,
+    duration in hours) or None for each leg and the encoded geometry, or None
+    if the request fails.
+    """
+
+    _name = "tms.router"
+    _description = "TMS Router"
+
+    @api.model
+    def _get_route_providers(self):
+        """Route providers options
+        profile: Identifies provider profile in route legs cache
+        max_waypoints: Places allowed in a request of consecutive legs
+        cache: Store results in route legs cache
+        """
+        return {
+            "googlemap": {"profile": "driving", "max_waypoints": 25, "cache": True},
+            "openrouteservice": {
+                "profile": "driving-hgv",
+                "max_waypoints": 50,
+                "cache": True,
+            },
+            "greatcircle": {
+                "profile": "greatcircle",
+                "max_waypoints": 0,
+                "cache": False,
+            },
+        }
+
+    @api.model
+    def _get_provider(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        provider_id = ICP.get_param("base_geolocalize.georoute_provider")
+        if provider_id:
+            provider = self.env["base.geo_provider"].browse(int(provider_id)).exists()
+            if provider.tech_name in self._get_route_providers():
+                return provider.tech_name
+        if ICP.get_param("base_geolocalize.google_map_api_key"):
+            return "googlemap"
+        if ICP.get_param("base_geolocalize.openrouteservice_api_key"):
+            return "openrouteservice"
+        return False
+
+    @api.model
+    def _is_legs_mode(self):
+        """Legs mode only requests consecutive checkpoints instead of a matrix"""
+        return (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("tms.route_request_mode", "matrix")
+            == "legs"
+        )
+
+    @api.model
+    def route_tasks(self, tasks):
+        """Estimate distance and duration of tasks and its checkpoints"""
+        provider = self._get_provider()
+        failed_tasks = self._route_tasks(tasks, provider) if provider else tasks
+        if (
+            failed_tasks
+            and provider != "greatcircle"
+            and self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("tms.route_offline_fallback")
+        ):
+            failed_tasks = self._route_tasks(failed_tasks, "greatcircle")
+        failed_tasks.update({"distance_estimated": 0.0, "planned_hours": 0.0})
+
+    @api.model
+    def _route_tasks(self, tasks, provider):
+        """Gather tasks legs, request to provider the ones not cached and write
+        results in tasks and checkpoints.
+        :return: tasks with legs not estimated by provider
+        """
+        RouteLeg = self.env["tms.route.leg"]
+        options = self._get_route_providers()[provider]
+        legs_mode = self._is_legs_mode()
+        with_geometry = legs_mode and bool(
+            self.env["ir.config_parameter"].sudo().get_param("tms.route_geometry")
+        )
+        tasks_legs = {task: task._get_route_legs() for task in tasks}
+        all_pairs = [
+            (origin, destination)
+            for legs in tasks_legs.values()
+            for _cp, origin, destination in legs
+        ]
+        # Full route is needed to get geometry
+        legs_values = (
+            RouteLeg.get_legs(all_pairs, provider, options["profile"])
+            if options["cache"] and not with_geometry
+            else {}
+        )
+        max_waypoints = options["max_waypoints"] if legs_mode else 0
+        runs = []
+        for task, legs in tasks_legs.items():
+            for places in self._split_route_runs(legs, legs_values, max_waypoints):
+                runs.append(
+                    {
+                        "task": task,
+                        "places": places,
+                        "coordinates": [
+                            (p.partner_latitude, p.partner_longitude) for p in places
+                        ],
+                    }
+                )
+        results = getattr(self, "_call_%s" % provider)(runs, with_geometry)
+        tasks_values = defaultdict(dict)
+        tasks_geometries = defaultdict(list)
+        for run, result in zip(runs, results):
+            if result is None:
+                continue
+            run_values, geometry = result
+            places = run["places"]
+            for i, values in enumerate(run_values):
+                if values is not None:
+                    tasks_values[run["task"]][(places[i].id, places[i + 1].id)] = values
+            if geometry:
+                tasks_geometries[run["task"]].append(geometry)
+        if options["cache"]:
+            # Only legs not served from cache, so their TTL is not refreshed
+            missing_pairs = [
+                (origin, destination)
+                for origin, destination in all_pairs
+                if (origin.id, destination.id) not in legs_values
+            ]
+            new_values = {}
+            for values in tasks_values.values():
+                new_values.update(values)
+            RouteLeg.set_legs(missing_pairs, new_values, provider, options["profile"])
+        failed_tasks = tasks.browse()
+        for task, legs in tasks_legs.items():
+            task_values = {**legs_values, **tasks_values[task]}
+            if not all((o.id, d.id) in task_values for _cp, o, d in legs):
+                failed_tasks |= task
+                continue
+            task._update_route_info(legs, task_values)
+            if with_geometry:
+                task.route_geometry = "\n".join(tasks_geometries[task])
+        return failed_tasks
+
+    @api.model
+    def _split_route_runs(self, legs, legs_values, max_waypoints):
+        """Group consecutive legs not available in legs_values
+        :param max_waypoints: places by group, without limit if 0
+        :return: list of places lists
+        """
+        runs = []
+        run = []
+        for _checkpoint, origin, destination in legs:
+            if (origin.id, destination.id) in legs_values:
+                run = []
+                continue
+            if (
+                not run
+                or run[-1] != origin
+                or (max_waypoints and len(run) >= max_waypoints)
+            ):
+                run = [origin]
+                runs.append(run)
+            run.append(destination)
+        return runs
+
+    @api.model
+    def _split_matrix_pairs(self, pairs, max_locations, max_routes):
+        """Group pairs in the fewest matrix requests allowed by provider limits.
+        Each chunk asks for all its origins against all its destinations.
+        :return: list of (origins, destinations, pairs) with origins and
+                 destinations as dict with the point as key and matrix index
+                 as value
+        """
+        chunks = []
+        origins, destinations, chunk_pairs = {}, {}, []
+        for origin, destination in sorted(pairs):
+            n_origins = len(origins) + (origin not in origins)
+            n_destinations = len(destinations) + (destination not in destinations)
+            if chunk_pairs and (
+                n_origins + n_destinations > max_locations
+                or n_origins * n_destinations > max_routes
+            ):
+                chunks.append((origins, destinations, chunk_pairs))
+                origins, destinations, chunk_pairs = {}, {}, []
+            origins.setdefault(origin, len(origins))
+            destinations.setdefault(destination, len(destinations))
+            chunk_pairs.append((origin, destination))
+        if chunk_pairs:
+            chunks.append((origins, destinations, chunk_pairs))
+        return chunks
+
+    @api.model
+    def _get_route_http_options(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        return {
+            "connect_timeout": float(ICP.get_param("tms.route_connect_timeout", 5.0)),
+            "read_timeout": float(ICP.get_param("tms.route_read_timeout", 30.0)),
+            "max_retries": int(ICP.get_param("tms.route_max_retries", 3)),
+            "backoff": float(ICP.get_param("tms.route_retry_backoff", 0.5)),
+            "failure_threshold": int(ICP.get_param("tms.route_failure_threshold", 5)),
+            "cooldown": float(ICP.get_param("tms.route_circuit_cooldown", 60.0)),
+        }
+
+    @api.model
+    def _route_execute(self, provider, calls):
+        """Execute provider requests in a bounded thread pool
+        :param calls: callables without ORM access
+        :return: list of results or raised exceptions in the same order
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        max_workers = int(ICP.get_param("tms.route_max_workers", 1))
+        rate = float(ICP.get_param("tms.route_rate_limit_%s" % provider, 0.0))
+        return run_concurrently(
+            calls, max_workers, get_rate_limiter(provider, rate) if rate else None
+        )
+
+    @api.model
+    def _route_matrix(self, provider, runs, max_locations, max_routes, prepare, parse):
+        """Get legs of runs with the fewest matrix requests
+        :param prepare: method that receives origins and destinations coordinates
+                        and returns a callable without ORM access that performs
+                        the request
+        :param parse: method that receives the request result and returns the
+                      distances and durations matrices or None if provider fails
+        """
+        pairs = {
+            (run["coordinates"][i], run["coordinates"][i + 1])
+            for run in runs
+            for i in range(len(run["coordinates"]) - 1)
+        }
+        chunks = self._split_matrix_pairs(pairs, max_locations, max_routes)
+        responses = self._route_execute(
+            provider,
+            [
+                prepare(list(origins), list(destinations))
+                for origins, destinations, _pairs in chunks
+            ],
+        )
+        pairs_values = {}
+        for (origins, destinations, chunk_pairs), response in zip(chunks, responses):
+            matrix = self._parse_response(provider, parse, response)
+            if matrix is None:
+                continue
+            distances, durations = matrix
+            for origin, destination in chunk_pairs:
+                i, j = origins[origin], destinations[destination]
+                # Unreachable places are returned as null
+                if distances[i][j] is None:
+                    continue
+                pairs_values[(origin, destination)] = (distances[i][j], durations[i][j])
+        results = []
+        for run in runs:
+            coordinates = run["coordinates"]
+            results.append(
+                (
+                    [
+                        pairs_values.get((coordinates[i], coordinates[i + 1]))
+                        for i in range(len(coordinates) - 1)
+                    ],
+                    False,
+                )
+            )
+        return results
+
+    @api.model
+    def _route_directions(self, provider, runs, with_geometry, prepare, parse):
+        """Get legs of runs with a directions request for each one
+        :param prepare: method that receives the run coordinates and returns a
+                        callable without ORM access that performs the request
+        :param parse: method that receives the request result and returns a list
+                      of (distance, duration) for each leg and the encoded
+                      geometry of route or None if provider fails
+        """
+        responses = self._route_execute(
+            provider, [prepare(run["coordinates"], with_geometry) for run in runs]
+        )
+        return [
+            self._parse_response(provider, parse, response, with_geometry)
+            for response in responses
+        ]
+
+    @api.model
+    def _parse_response(self, provider, parse, response, *args):
+        """Parse provider response, malformed responses are failed requests
+        as provider errors, so all providers return None on failure
+        """
+        try:
+            return parse(response, *args)
+        except (ValueError, KeyError, IndexError, TypeError) as err:
+            _logger.error("Unexpected response from %s: %s", provider, err)
+            return None
+
+    # Google Maps
+
+    @api.model
+    def _call_googlemap(self, runs, with_geometry):
+        if self._is_legs_mode():
+            return self._route_directions(
+                "googlemap",
+                runs,
+                with_geometry,
+                self._prepare_googlemap_directions,
+                self._parse_googlemap_directions,
+            )
+        return self._route_matrix(
+            "googlemap",
+            runs,
+            25,
+            100,
+            self._prepare_googlemap_matrix,
+            self._parse_googlemap_matrix,
+        )
+
+    @api.model
+    def _get_googlemap_params(self):
+        return {
+            "mode": "driving",
+            "language": self.env.lang,
+            "key": self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("base_geolocalize.google_map_api_key"),
+        }
+
+    @api.model
+    def _prepare_googlemap_matrix(self, origins, destinations):
+        params = dict(
+            self._get_googlemap_params(),
+            origins="|".join("%s,%s" % point for point in origins),
+            destinations="|".join("%s,%s" % point for point in destinations),
+        )
+        return partial(
+            route_request,
+            "googlemap",
+            "GET",
+            "https://maps.googleapis.com/maps/api/distancematrix/json",
+            params=params,
+            **self._get_route_http_options()
+        )
+
+    @api.model
+    def _parse_googlemap_matrix(self, response):
+        if isinstance(response, Exception):
+            _logger.error("Request to Google Maps failed: %s", response)
+            return None
+        result = response.json()
+        if result["status"] != "OK":
+            _logger.error("Request to Google Maps failed: %s", result["status"])
+            return None
+        distances, durations = [], []
+        for row in result["rows"]:
+            distances.append([])
+            durations.append([])
+            for element in row["elements"]:
+                ok = element["status"] == "OK"
+                distances[-1].append(
+                    element["distance"]["value"] / 1000.0 if ok else None
+                )
+                durations[-1].append(
+                    element["duration"]["value"] / 3600.0 if ok else None
+                )
+        return distances, durations
+
+    @api.model
+    def _prepare_googlemap_directions(self, coordinates, with_geometry):
+        points = ["%s,%s" % point for point in coordinates]
+        params = dict(
+            self._get_googlemap_params(), origin=points[0], destination=points[-1]
+        )
+        if len(points) > 2:
+            params["waypoints"] = "|".join(points[1:-1])
+        return partial(
+            route_request,
+            "googlemap",
+            "GET",
+            "https://maps.googleapis.com/maps/api/directions/json",
+            params=params,
+            **self._get_route_http_options()
+        )
+
+    @api.model
+    def _parse_googlemap_directions(self, response, with_geometry):
+        if isinstance(response, Exception):
+            _logger.error("Request to Google Maps failed: %s", response)
+            return None
+        result = response.json()
+        if result["status"] != "OK":
+            _logger.error("Request to Google Maps failed: %s", result["status"])
+            return None
+        route = result["routes"][0]
+        legs_values = [
+            (leg["distance"]["value"] / 1000.0, leg["duration"]["value"] / 3600.0)
+            for leg in route["legs"]
+        ]
+        geometry = with_geometry and route["overview_polyline"]["points"]
+        return legs_values, geometry
+
+    # Openrouteservice
+
+    @api.model
+    def _call_openrouteservice(self, runs, with_geometry):
+        if self._is_legs_mode():
+            return self._route_directions(
+                "openrouteservice",
+                runs,
+                with_geometry,
+                self._prepare_openrouteservice_directions,
+                self._parse_openrouteservice_directions,
+            )
+        ICP = self.env["ir.config_parameter"].sudo()
+        return self._route_matrix(
+            "openrouteservice",
+            runs,
+            int(ICP.get_param("tms.openrouteservice_max_locations", 50)),
+            int(ICP.get_param("tms.openrouteservice_max_routes", 3500)),
+            self._prepare_openrouteservice_matrix,
+            self._parse_openrouteservice_matrix,
+        )
+
+    @api.model
+    def _get_openrouteservice_url(self, service):
+        base_url = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("tms.openrouteservice_url", "https://api.openrouteservice.org")
+        )
+        return "%s/v2/%s/driving-hgv" % (base_url.rstrip("/"), service)
+
+    @api.model
+    def _get_openrouteservice_headers(self):
+        # TODO: Change to company field
+        token = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("base_geolocalize.openrouteservice_api_key")
+        )
+        return {
+            "Accept": "application/json, application/geo+json, "
+            "application/gpx+xml, img/png; charset=utf-8",
+            "Authorization": token,
+            "Content-Type": "application/json; charset=utf-8",
+        }
+
+    @api.model
+    def _prepare_openrouteservice_matrix(self, origins, destinations):
+        points = origins + destinations
+        body = {
+            "locations": [[longitude, latitude] for latitude, longitude in points],
+            "sources": list(range(len(origins))),
+            "destinations": list(range(len(origins), len(points))),
+            "metrics": ["distance", "duration"],
+            "units": "km",
+        }
+        return partial(
+            route_request,
+            "openrouteservice",
+            "POST",
+            self._get_openrouteservice_url("matrix"),
+            json=body,
+            headers=self._get_openrouteservice_headers(),
+            **self._get_route_http_options()
+        )
+
+    @api.model
+    def _parse_openrouteservice_matrix(self, response):
+        if isinstance(response, Exception) or response.status_code != 200:
+            _logger.error(
+                "Request to openrouteservice failed.\nContent: %s"
+                % (getattr(response, "content", response),)
+            )
+            return None
+        result = response.json()
+        durations = [
+            [duration / 3600.0 if duration is not None else None for duration in row]
+            for row in result["durations"]
+        ]
+        return result["distances"], durations
+
+    @api.model
+    def _prepare_openrouteservice_directions(self, coordinates, with_geometry):
+        body = {
+            "coordinates": [
+                [longitude, latitude] for latitude, longitude in coordinates
+            ],
+            "geometry": with_geometry,
+            "instructions": False,
+            "units": "km",
+        }
+        return partial(
+            route_request,
+            "openrouteservice",
+            "POST",
+            self._get_openrouteservice_url("directions"),
+            json=body,
+            headers=self._get_openrouteservice_headers(),
+            **self._get_route_http_options()
+        )
+
+    @api.model
+    def _parse_openrouteservice_directions(self, response, with_geometry):
+        if isinstance(response, Exception) or response.status_code != 200:
+            _logger.error(
+                "Request to openrouteservice failed.\nContent: %s"
+                % (getattr(response, "content", response),)
+            )
+            return None
+        route = response.json()["routes"][0]
+        legs_values = [
+            (segment.get("distance", 0.0), segment.get("duration", 0.0) / 3600.0)
+            for segment in route["segments"]
+        ]
+        return legs_values, with_geometry and route.get("geometry")
+
+    @api.model
+    def distance_matrix(self, places):
+        """Distances in km between geolocated places. Great circle distances
+        corrected with circuity factor are replaced by cached provider legs.
+        :return: list of lists with distance from places[i] to places[j]
+        """
+        circuity = float(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("tms.route_circuity_factor", 1.3)
+        )
+        latitudes = [[p.partner_latitude] for p in places]
+        longitudes = [[p.partner_longitude] for p in places]
+        matrix = (
+            haversine_km(
+                latitudes,
+                longitudes,
+                [p.partner_latitude for p in places],
+                [p.partner_longitude for p in places],
+            )
+            * circuity
+        ).tolist()
+        provider = self._get_provider()
+        options = self._get_route_providers().get(provider)
+        if options and options["cache"]:
+            pairs = [(o, d) for o in places for d in places if o != d]
+            legs_values = self.env["tms.route.leg"].get_legs(
+                pairs, provider, options["profile"]
+            )
+            index = {place.id: i for i, place in enumerate(places)}
+            for (origin_id, destination_id), values in legs_values.items():
+                matrix[index[origin_id]][index[destination_id]] = values[0]
+        return matrix
+
+    # Great circle (offline)
+
+    @api.model
+    def _call_greatcircle(self, runs, with_geometry):
+        """Great circle distance corrected with the circuity factor and
+        duration from the average speed of the tractor model. All legs are
+        computed at once.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        default_circuity = float(ICP.get_param("tms.route_circuity_factor", 1.3))
+        if default_circuity <= 0.0:
+            default_circuity = 1.0
+        default_speed = float(
+            ICP.get_param("tms.route_average_speed", DEFAULT_AVERAGE_SPEED)
+        )
+        if default_speed <= 0.0:
+            default_speed = DEFAULT_AVERAGE_SPEED
+        origins = [p for run in runs for p in run["coordinates"][:-1]]
+        destinations = [p for run in runs for p in run["coordinates"][1:]]
+        distances = haversine_km(
+            [p[0] for p in origins],
+            [p[1] for p in origins],
+            [p[0] for p in destinations],
+            [p[1] for p in destinations],
+        ).tolist()
+        results = []
+        index = 0
+        for run in runs:
+            model = run["task"].tractor_id.model_id
+            circuity = model.circuity_factor
+            if circuity <= 0.0:
+                circuity = default_circuity
+            speed = model.average_speed
+            if speed <= 0.0:
+                speed = default_speed
+            n_legs = len(run["coordinates"]) - 1
+            results.append(
+                (
+                    [
+                        (d * circuity, d * circuity / speed)
+                        for d in distances[index : index + n_legs]
+                    ],
+                    False,
+                )
+            )
+            index += n_legs
+        return results
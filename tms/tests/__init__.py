@@ -1,3 +1,5 @@
 from . import common
 from . import test_tms_equipment
 from . import test_tms
+from . import test_tms_route
+from . import test_tms_package_import
@@ -1,6 +1,9 @@
 # Copyright 2019 Alexandre Díaz
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+from unittest.mock import patch
+
 from odoo import fields
+from odoo.exceptions import ValidationError
 
 from .common import TestTMS
 
@@ -70,3 +73,501 @@ class TestTMSFlow(TestTMS):
         sale_order.write({"wagon": "TextWagonB", "vessel": "TestVesselB"})
         self.assertNotEqual(task.wagon, "TextWagon")
         self.assertNotEqual(task.vessel, "TestVessel")
+
+    def test_fill_checkpoints_incremental(self):
+        place = self.env["res.partner"].create(
+            {"name": "Second Destination", "is_shipping_place": True}
+        )
+        package = self.env["tms.package"].create(
+            {
+                "shipping_origin_id": self.partner_origin.id,
+                "shipping_destination_id": self.partner_destination.id,
+                "pickup_date": fields.Datetime.now(),
+            }
+        )
+        task = self.env["project.task"].create(
+            {
+                "name": "Checkpoints task",
+                "project_id": self.project.id,
+                "tms_package_ids": [(6, 0, package.ids)],
+            }
+        )
+        self.assertEqual(task.fill_checkpoints(), task)
+        checkpoints = task.checkpoint_ids
+        self.assertEqual(len(checkpoints), 2)
+        checkpoints[1].distance_estimated = 100.0
+        # Nothing changes, checkpoints and estimations are kept
+        self.assertFalse(task.fill_checkpoints())
+        self.assertEqual(task.checkpoint_ids, checkpoints)
+        self.assertEqual(checkpoints[1].distance_estimated, 100.0)
+        # Only new destination is created
+        package2 = self.env["tms.package"].create(
+            {
+                "shipping_origin_id": self.partner_origin.id,
+                "shipping_destination_id": place.id,
+                "pickup_date": package.pickup_date,
+            }
+        )
+        task.tms_package_ids |= package2
+        self.assertEqual(task.fill_checkpoints(), task)
+        self.assertEqual(len(task.checkpoint_ids), 3)
+        self.assertTrue(checkpoints < task.checkpoint_ids)
+        self.assertEqual(checkpoints[0].package_origin_ids, package | package2)
+        self.assertEqual(checkpoints[1].distance_estimated, 100.0)
+
+    def test_fill_checkpoints_missing_keys(self):
+        package = self.env["tms.package"].create(
+            {
+                "shipping_origin_id": self.partner_origin.id,
+                "shipping_destination_id": self.partner_destination.id,
+                "pickup_date": fields.Datetime.now(),
+            }
+        )
+        task = self.env["project.task"].create(
+            {
+                "name": "Checkpoints task",
+                "project_id": self.project.id,
+                "release_id": self.partner_destination.id,
+                "tms_package_ids": [(6, 0, package.ids)],
+            }
+        )
+        task.fill_checkpoints()
+        checkpoints = task.checkpoint_ids
+        self.assertEqual(len(checkpoints), 3)
+        keys = [(c.checkpoint_type, c.week) for c in checkpoints]
+        checkpoints[1].distance_estimated = 100.0
+        # Checkpoints created before type and week were stored
+        checkpoints.flush()
+        self.env.cr.execute(
+            """
+            UPDATE project_task_checkpoint SET checkpoint_type = NULL, week = NULL
+            WHERE id IN %s
+            """,
+            (tuple(checkpoints.ids),),
+        )
+        checkpoints.invalidate_cache()
+        self.env["project.task.checkpoint"]._fill_missing_keys()
+        self.assertEqual([(c.checkpoint_type, c.week) for c in checkpoints], keys)
+        self.assertFalse(task.fill_checkpoints())
+        self.assertEqual(task.checkpoint_ids, checkpoints)
+        self.assertEqual(checkpoints[1].distance_estimated, 100.0)
+
+    def test_fill_checkpoints_key_override(self):
+        package = self.env["tms.package"].create(
+            {
+                "shipping_origin_id": self.partner_origin.id,
+                "shipping_destination_id": self.partner_destination.id,
+                "pickup_date": fields.Datetime.now(),
+            }
+        )
+        task = self.env["project.task"].create(
+            {
+                "name": "Checkpoints task",
+                "project_id": self.project.id,
+                "tms_package_ids": [(6, 0, package.ids)],
+            }
+        )
+        get_checkpoint_key = type(task).get_checkpoint_key
+
+        def get_checkpoint_key_override(task, package, orig_dest):
+            place, week, orig_dest = get_checkpoint_key(task, package, orig_dest)
+            return place, "000000", orig_dest
+
+        with patch.object(
+            type(task), "get_checkpoint_key", get_checkpoint_key_override
+        ):
+            task.fill_checkpoints()
+        self.assertEqual(task.checkpoint_ids.mapped("week"), ["000000", "000000"])
+        self.assertEqual(
+            task.checkpoint_ids.mapped("place_id"),
+            self.partner_origin | self.partner_destination,
+        )
+
+    def test_fill_checkpoints_batch(self):
+        depot = self.env["res.partner"].create(
+            {"name": "Depot", "is_shipping_place": True}
+        )
+        packages = self.env["tms.package"].create(
+            [
+                {
+                    "shipping_origin_id": self.partner_origin.id,
+                    "shipping_destination_id": self.partner_destination.id,
+                    "pickup_date": fields.Datetime.now(),
+                }
+                for _i in range(3)
+            ]
+        )
+        tasks = self.env["project.task"].create(
+            [
+                {
+                    "name": "Batch task %s" % package.name,
+                    "project_id": self.project.id,
+                    "shipping_origin_id": depot.id,
+                    "tms_package_ids": [(6, 0, package.ids)],
+                }
+                for package in packages
+            ]
+        )
+        self.assertEqual(tasks.fill_checkpoints(), tasks)
+        for task, package in zip(tasks, packages):
+            # Task origin is added before packages origin
+            self.assertEqual(
+                task.checkpoint_ids.mapped("place_id").ids,
+                [depot.id, self.partner_origin.id, self.partner_destination.id],
+            )
+            self.assertEqual(task.checkpoint_ids[1].package_origin_ids, package)
+
+    def test_tms_package_all_ids(self):
+        packages = self.env["tms.package"].create(
+            [{"sequence": sequence} for sequence in (30, 10, 20)]
+        )
+        parent = self.env["project.task"].create(
+            {
+                "name": "Parent task",
+                "project_id": self.project.id,
+                "tms_package_ids": [(6, 0, packages[0].ids)],
+            }
+        )
+        child = self.env["project.task"].create(
+            {
+                "name": "Child task",
+                "project_id": self.project.id,
+                "parent_id": parent.id,
+                "tms_package_ids": [(6, 0, packages[1].ids)],
+            }
+        )
+        self.env["project.task"].create(
+            {
+                "name": "Grandchild task",
+                "project_id": self.project.id,
+                "parent_id": child.id,
+                "tms_package_ids": [(6, 0, packages[1:].ids)],
+            }
+        )
+        self.assertEqual(
+            parent.tms_package_all_ids.ids,
+            [packages[1].id, packages[2].id, packages[0].id],
+        )
+        self.assertEqual(
+            child.tms_package_all_ids.ids, packages[1:].sorted("sequence").ids
+        )
+
+    def test_package_totals(self):
+        packages = self.env["tms.package"].create(
+            [{"shipping_weight": 100.0, "pallet_qty": 2} for _i in range(2)]
+        )
+        parent = self.env["project.task"].create(
+            {
+                "name": "Parent task",
+                "project_id": self.project.id,
+                "tms_package_ids": [(6, 0, packages[0].ids)],
+            }
+        )
+        child = self.env["project.task"].create(
+            {
+                "name": "Child task",
+                "project_id": self.project.id,
+                "parent_id": parent.id,
+            }
+        )
+        self.assertEqual(parent.weight, 100.0)
+        # Linking a package in a child updates parent totals
+        child.tms_package_ids = packages
+        self.assertEqual(child.weight, 200.0)
+        self.assertEqual(parent.weight, 200.0)
+        self.assertEqual(parent.pallet_qty, 4)
+        packages[1].shipping_weight = 50.0
+        self.assertEqual(parent.weight, 150.0)
+        # Stored totals can be grouped
+        groups = self.env["project.task"].read_group(
+            [("id", "in", (parent | child).ids)], ["weight"], ["project_id"]
+        )
+        self.assertEqual(groups[0]["weight"], 300.0)
+
+    def test_package_state(self):
+        package = self.env["tms.package"].create(
+            {
+                "shipping_origin_id": self.partner_origin.id,
+                "shipping_destination_id": self.partner_destination.id,
+                "pickup_date": fields.Datetime.now(),
+            }
+        )
+        self.assertEqual(package.state, "draft")
+        task = self.env["project.task"].create(
+            {
+                "name": "State task",
+                "project_id": self.project.id,
+                "tms_package_ids": [(6, 0, package.ids)],
+            }
+        )
+        task.fill_checkpoints()
+        self.assertEqual(package.state, "ready")
+        employee = self.env["hr.employee"].create({"name": "Timesheet Employee"})
+        timesheet = self.env["account.analytic.line"].create(
+            {
+                "name": "Work",
+                "project_id": self.project.id,
+                "task_id": task.id,
+                "employee_id": employee.id,
+                "unit_amount": 1.0,
+            }
+        )
+        self.assertEqual(package.state, "progress")
+        timesheet.unlink()
+        self.assertEqual(package.state, "ready")
+        package.checkpoint_origin_ids.register_arrival_time()
+        self.assertEqual(package.state, "loading")
+        package.checkpoint_destination_ids.register_departure_time()
+        self.assertEqual(package.state, "done")
+        # Recompute from stored data gives the same state
+        self.env["tms.package"].recompute_all_states(chunk_size=1)
+        self.assertEqual(package.state, "done")
+        logs = self.env["tms.package.state.log"].search(
+            [("package_id", "=", package.id)], order="id"
+        )
+        self.assertEqual(logs.mapped("state")[0], "draft")
+        self.assertEqual(logs.mapped("state")[-2:], ["loading", "done"])
+        self.assertEqual(logs[-1].place_id, self.partner_destination)
+        self.assertEqual(logs[-1].previous_state, "loading")
+        kpis = self.env["tms.package.state.log"].get_state_kpis(
+            fields.Datetime.subtract(fields.Datetime.now(), days=1),
+            fields.Datetime.add(fields.Datetime.now(), days=1),
+        )
+        self.assertIn(self.partner_destination.id, [kpi["group_id"] for kpi in kpis])
+
+    def test_package_bulk_sequence(self):
+        sequence = self.env.ref("tms.seq_tms_package")
+        packages = self.env["tms.package"].create([{"name": "/"} for _i in range(5)])
+        names = packages.mapped("name")
+        self.assertEqual(len(set(names)), 5)
+        self.assertTrue(all(name.startswith("PK") for name in names))
+        sequence.implementation = "no_gap"
+        number_next = sequence.number_next
+        packages = self.env["tms.package"].create([{"name": "/"} for _i in range(3)])
+        self.assertEqual(
+            sorted(packages.mapped("name")),
+            [sequence.get_next_char(number_next + i) for i in range(3)],
+        )
+        self.assertEqual(sequence.number_next, number_next + 3)
+
+    def test_vehicle_workload_cache(self):
+        Vehicle = self.env["fleet.vehicle"]
+        task = self.env["project.task"].create(
+            {
+                "name": "Workload task",
+                "project_id": self.project.id,
+                "tractor_id": self.vehicle.id,
+            }
+        )
+        workload = Vehicle._get_workload()
+        self.assertEqual(workload[self.vehicle.id]["count"], 1)
+        self.assertIs(Vehicle._get_workload([("name", "=", "Other")]), workload)
+        date_term = ("date_start", ">=", "2026-01-01 00:00:00")
+        self.assertEqual(
+            Vehicle._normalize_task_domain([("name", "=", "Other"), date_term]),
+            Vehicle._normalize_task_domain([date_term]),
+        )
+        task.copy({"tractor_id": self.vehicle.id})
+        self.assertIsNot(Vehicle._get_workload(), workload)
+        self.assertEqual(Vehicle._get_workload()[self.vehicle.id]["count"], 2)
+
+    def test_vehicle_workload_table(self):
+        Workload = self.env["fleet.vehicle.workload"]
+        task = self.env["project.task"].create(
+            {
+                "name": "Workload table task",
+                "project_id": self.project.id,
+                "tractor_id": self.vehicle.id,
+            }
+        )
+        workload = Workload._get_vehicles_workload(self.vehicle.ids)
+        self.assertEqual(workload[self.vehicle.id]["count"], 1)
+        closed_stage = self.env["project.task.type"].create(
+            {"name": "Closed", "is_closed": True}
+        )
+        task.stage_id = closed_stage
+        workload = Workload._get_vehicles_workload(self.vehicle.ids)
+        self.assertNotIn(self.vehicle.id, workload)
+        closed_stage.is_closed = False
+        # Empty recordsets do nothing
+        self.env["project.task.type"].write({"is_closed": True})
+        self.assertEqual(self.vehicle.task_count, 1)
+        Workload.rebuild()
+        workload = Workload._get_vehicles_workload(self.vehicle.ids)
+        self.assertEqual(workload[self.vehicle.id]["count"], 1)
+        # Checkpoints change the pending duration
+        checkpoint = self.env["project.task.checkpoint"].create(
+            {
+                "task_id": task.id,
+                "place_id": self.partner_origin.id,
+                "duration_estimated": 2.0,
+            }
+        )
+        workload = Workload._get_vehicles_workload(self.vehicle.ids)
+        self.assertEqual(workload[self.vehicle.id]["duration"], 2.0)
+        checkpoint.departure_time = fields.Datetime.now()
+        workload = Workload._get_vehicles_workload(self.vehicle.ids)
+        self.assertEqual(workload[self.vehicle.id]["duration"], 0.0)
+
+    def test_vehicle_next_checkpoints(self):
+        stage = self.env["project.task.type"].create(
+            {"name": "In progress", "sequence": 5}
+        )
+        task = self.env["project.task"].create(
+            {
+                "name": "Next checkpoints task",
+                "project_id": self.project.id,
+                "tractor_id": self.vehicle.id,
+                "stage_id": stage.id,
+                "checkpoint_ids": [
+                    (0, 0, {"place_id": place.id, "sequence": sequence})
+                    for sequence, place in enumerate(
+                        (self.partner_origin, self.partner_destination)
+                    )
+                ],
+            }
+        )
+        self.assertEqual(self.vehicle.next_checkpoint_ids.ids, task.checkpoint_ids.ids)
+        task.checkpoint_ids[0].register_departure_time()
+        vehicle = self.vehicle.with_context(next_checkpoints_limit=1)
+        self.assertEqual(vehicle.next_checkpoint_ids, task.checkpoint_ids[1])
+
+    def test_vehicle_next_checkpoints_multi_company(self):
+        stage = self.env["project.task.type"].create(
+            {"name": "In progress", "sequence": 5}
+        )
+        company = self.env["res.company"].create({"name": "Other company"})
+        project = self.env["project.project"].create(
+            {"name": "Other company project", "company_id": company.id}
+        )
+        task = self.env["project.task"].create(
+            {
+                "name": "Other company task",
+                "project_id": project.id,
+                "company_id": company.id,
+                "tractor_id": self.vehicle.id,
+                "stage_id": stage.id,
+                "checkpoint_ids": [(0, 0, {"place_id": self.partner_origin.id})],
+            }
+        )
+        vehicle = self.vehicle.with_context(
+            allowed_company_ids=(self.env.company | company).ids
+        )
+        self.assertEqual(vehicle.next_checkpoint_ids, task.checkpoint_ids)
+        vehicle = self.vehicle.with_context(allowed_company_ids=self.env.company.ids)
+        self.assertFalse(vehicle.next_checkpoint_ids)
+
+    def test_vehicle_availability(self):
+        date_start = fields.Datetime.add(fields.Datetime.now(), days=1)
+        date_end = fields.Datetime.add(date_start, hours=8)
+        self.env["project.task"].create(
+            {
+                "name": "Availability task",
+                "project_id": self.project.id,
+                "tractor_id": self.vehicle.id,
+                "date_start": date_start,
+                "date_end": date_end,
+            }
+        )
+        before = fields.Datetime.subtract(date_start, hours=2)
+        self.assertEqual(
+            self.vehicle.get_free_vehicles(before, date_start), self.vehicle
+        )
+        self.assertFalse(
+            self.vehicle.get_free_vehicles(
+                before, fields.Datetime.add(date_start, hours=1)
+            )
+        )
+        slots = self.vehicle.get_next_free_slots(before, hours=4)
+        self.assertEqual(slots[self.vehicle.id], date_end)
+        self.assertEqual(
+            self.env["project.task"]._get_domain_date_window(
+                [("date_start", ">=", before), ("date_start", "<=", date_start)]
+            ),
+            (before, date_start),
+        )
+        # Only an upper bound in the past is not a window
+        self.assertIsNone(
+            self.env["project.task"]._get_domain_date_window(
+                [("date_start", "<=", "2000-01-01 00:00:00")]
+            )
+        )
+
+    def test_assign_vehicles(self):
+        tag = self.env["fleet.vehicle.tag"].create({"name": "Reefer"})
+        self.partner_destination.trailer_tag_ids = tag
+        trailer = self.vehicle.copy(
+            {"vehicle_type": "trailer", "tag_ids": [(6, 0, tag.ids)]}
+        )
+        tractors = self.vehicle | self.vehicle.copy({"trailer_id": trailer.id})
+        date_start = fields.Datetime.add(fields.Datetime.now(), days=1)
+        tasks = self.env["project.task"].create(
+            [
+                {
+                    "name": "Assign task %s" % i,
+                    "project_id": self.project.id,
+                    "date_start": date_start,
+                    "date_end": fields.Datetime.add(date_start, hours=4),
+                    "checkpoint_ids": [
+                        (0, 0, {"place_id": self.partner_origin.id, "sequence": 1}),
+                        (
+                            0,
+                            0,
+                            {"place_id": self.partner_destination.id, "sequence": 2},
+                        ),
+                    ],
+                }
+                for i in range(2)
+            ]
+        )
+        assignments = tasks.assign_vehicles(tractors=tractors, apply=False)
+        # Only one tractor trailer has required tags and it can not do both tasks
+        self.assertEqual(list(assignments.values()), [tractors[1].id])
+        self.assertFalse(tasks.mapped("tractor_id"))
+        tasks.assign_vehicles(tractors=tractors)
+        self.assertEqual(tasks.mapped("tractor_id"), tractors[1])
+
+    def test_kanban_tractor_drop(self):
+        trailer = self.vehicle.copy({"vehicle_type": "trailer"})
+        self.vehicle.trailer_id = trailer
+        tasks = self.env["project.task"].create(
+            [
+                {"name": "Kanban task %s" % i, "project_id": self.project.id}
+                for i in range(2)
+            ]
+        )
+        tasks.with_context(params={"view_type": "kanban"}).write(
+            {"tractor_id": self.vehicle.id}
+        )
+        self.assertEqual(tasks.mapped("trailer_id"), trailer)
+        self.assertEqual(tasks.mapped("driver_id"), self.driver)
+        self.assertEqual(tasks.mapped("vendor_id"), self.driver.commercial_partner_id)
+        # Without tractor onchange the driver is kept and the vendor reset
+        tasks.with_context(
+            params={"view_type": "kanban"}, skip_tractor_onchange=True
+        ).write({"tractor_id": self.vehicle.id})
+        self.assertEqual(tasks.mapped("driver_id"), self.driver)
+        self.assertFalse(tasks.mapped("vendor_id"))
+
+    def test_incompatible_tags(self):
+        tag = self.env["fleet.vehicle.tag"].create({"name": "Tautliner"})
+        self.partner_destination.trailer_tag_ids = tag
+        tasks = self.env["project.task"].create(
+            [
+                {
+                    "name": "Tags task %s" % i,
+                    "project_id": self.project.id,
+                    "checkpoint_ids": [
+                        (0, 0, {"place_id": self.partner_destination.id})
+                    ],
+                }
+                for i in range(2)
+            ]
+        )
+        with self.assertRaises(ValidationError) as error:
+            tasks.write({"tractor_id": self.vehicle.id})
+        for task in tasks:
+            self.assertIn(task.name, str(error.exception))
+        self.vehicle.tag_ids = tag
+        tasks.write({"tractor_id": self.vehicle.id})
+        self.assertEqual(tasks.mapped("tractor_id"), self.vehicle)
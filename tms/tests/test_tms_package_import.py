@@ -0,0 +1,47 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import base64
+
+from .common import TestTMS
+
+
+class TestTMSPackageImport(TestTMS):
+    def _import(self, content, **kwargs):
+        wizard = self.env["tms.package.import"].create(
+            dict(
+                file=base64.b64encode(content.encode()),
+                filename="manifest.csv",
+                **kwargs
+            )
+        )
+        wizard.action_import()
+        return wizard
+
+    def test_import_csv(self):
+        self.partner_origin.ref = "ORIG"
+        content = (
+            "customer_ref,shipping_origin_id,shipping_destination_id,partner_id,"
+            "goods_id,shipping_weight,pallet_qty,pickup_date\n"
+            "REF1,ORIG,Destination Test,Customer Test,Tests Goods,100.5,2,"
+            "2026-01-05 08:00:00\n"
+            "REF2,Origin Test,Unknown place,Customer Test,,10,1,\n"
+            "REF3,orig,destination test,,,abc,1,\n"
+            "REF4,orig,destination test,,,20,3,\n"
+        )
+        wizard = self._import(content, chunk_size=2)
+        self.assertEqual(wizard.imported_count, 2)
+        self.assertEqual(wizard.rejected_count, 2)
+        self.assertTrue(wizard.rejected_file)
+        rejected = base64.b64decode(wizard.rejected_file).decode()
+        self.assertIn("Unknown place", rejected)
+        packages = self.env["tms.package"].search(
+            [("customer_ref", "in", ["REF1", "REF4"])], order="customer_ref"
+        )
+        self.assertEqual(len(packages), 2)
+        self.assertEqual(packages[0].shipping_origin_id, self.partner_origin)
+        self.assertEqual(packages[0].shipping_destination_id, self.partner_destination)
+        self.assertEqual(packages[0].partner_id, self.customer)
+        self.assertEqual(packages[0].goods_id, self.goods)
+        self.assertEqual(packages[0].shipping_weight, 100.5)
+        self.assertEqual(packages[1].pallet_qty, 3)
+        self.assertTrue(packages[1].name.startswith("PK"))
@@ -0,0 +1,424 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+import logging
+import time
+from unittest import mock
+
+from odoo import fields
+from odoo.tests import tagged
+
+from ..tools import route_http
+from ..tools.route_optimizer import optimize_route
+from ..tools.route_pool import RateLimiter, get_rate_limiter, run_concurrently
+from ..tools.route_standin import RouteStandInServer
+from .common import TestTMS
+
+_logger = logging.getLogger(__name__)
+
+GET_SESSION = "odoo.addons.tms.tools.route_http.get_session"
+
+
+class TestTMSRoute(TestTMS):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner_origin.write(
+            {"partner_latitude": 39.46975, "partner_longitude": -0.37739}
+        )
+        cls.partner_destination.write(
+            {"partner_latitude": 40.41650, "partner_longitude": -3.70256}
+        )
+        ICP = cls.env["ir.config_parameter"].sudo()
+        ICP.set_param("base_geolocalize.google_map_api_key", False)
+        ICP.set_param("base_geolocalize.openrouteservice_api_key", "test-key")
+        ICP.set_param("tms.route_max_retries", "0")
+        ICP.set_param("tms.route_failure_threshold", "0")
+        cls.task = cls.env["project.task"].create(
+            {
+                "name": "Route task",
+                "project_id": cls.project.id,
+                "checkpoint_ids": [
+                    (0, 0, {"place_id": cls.partner_origin.id, "sequence": 1}),
+                    (0, 0, {"place_id": cls.partner_destination.id, "sequence": 2}),
+                ],
+            }
+        )
+
+    def _ors_response(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {
+            "distances": [[355.0]],
+            "durations": [[12600.0]],
+        }
+        return response
+
+    def test_route_leg_cache(self):
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            post.return_value = self._ors_response()
+            self.task.get_route_info()
+            self.assertEqual(post.call_count, 1)
+            self.assertEqual(self.task.distance_estimated, 355.0)
+            self.assertAlmostEqual(self.task.planned_hours, 3.5)
+            # Second estimation is served from cache without rewriting legs
+            leg = self.env["tms.route.leg"].search(
+                [("origin_id", "=", self.partner_origin.id)]
+            )
+            with mock.patch.object(
+                type(self.env["tms.route.leg"]), "write", autospec=True
+            ) as write:
+                self.task.get_route_info()
+                self.assertFalse(write.call_count)
+            self.assertTrue(leg)
+            self.assertEqual(post.call_count, 1)
+            self.assertEqual(self.task.checkpoint_ids[1].distance_estimated, 355.0)
+            # Moving a place invalidates its legs
+            self.partner_destination.partner_latitude = 40.5
+            self.task.get_route_info()
+            self.assertEqual(post.call_count, 2)
+
+    def test_route_batch_tasks(self):
+        task2 = self.task.copy(
+            {
+                "checkpoint_ids": [
+                    (0, 0, {"place_id": self.partner_destination.id, "sequence": 1}),
+                    (0, 0, {"place_id": self.partner_origin.id, "sequence": 2}),
+                ]
+            }
+        )
+        tasks = self.task | task2
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            response = mock.Mock(status_code=200)
+            # Sources: origin, destination. Destinations: destination, origin
+            response.json.return_value = {
+                "distances": [[355.0, 0.0], [0.0, 360.0]],
+                "durations": [[12600.0, 0.0], [0.0, 13000.0]],
+            }
+            post.return_value = response
+            tasks.get_route_info()
+            self.assertEqual(post.call_count, 1)
+        self.assertEqual(self.task.distance_estimated, 355.0)
+        self.assertEqual(task2.distance_estimated, 360.0)
+
+    def test_split_matrix_pairs(self):
+        Router = self.env["tms.router"]
+        points = [(39.4, -0.3), (40.4, -3.7), (41.3, 2.1)]
+        pairs = [(o, d) for o in points for d in points if o != d]
+        chunks = Router._split_matrix_pairs(pairs, 50, 3500)
+        self.assertEqual(len(chunks), 1)
+        chunks = Router._split_matrix_pairs(pairs, 50, 2)
+        self.assertEqual(sum(len(c[2]) for c in chunks), len(pairs))
+        for origins, destinations, _pairs in chunks:
+            self.assertLessEqual(len(origins) * len(destinations), 2)
+
+    def test_route_legs_mode(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("tms.route_request_mode", "legs")
+        ICP.set_param("tms.route_geometry", "True")
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            response = mock.Mock(status_code=200)
+            response.json.return_value = {
+                "routes": [
+                    {
+                        "segments": [{"distance": 355.0, "duration": 12600.0}],
+                        "geometry": "encoded_polyline",
+                    }
+                ]
+            }
+            post.return_value = response
+            self.task.get_route_info()
+            self.assertEqual(post.call_count, 1)
+            self.assertTrue(post.call_args[0][1].endswith("directions/driving-hgv"))
+        self.assertEqual(self.task.distance_estimated, 355.0)
+        self.assertEqual(self.task.route_geometry, "encoded_polyline")
+
+    def test_route_offline_fallback(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("tms.route_offline_fallback", "True")
+        ICP.set_param("tms.route_circuity_factor", "1.0")
+        ICP.set_param("tms.route_average_speed", "100")
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            post.return_value = mock.Mock(status_code=500)
+            self.task.get_route_info()
+        # Great circle distance between Valencia and Madrid is about 302 km
+        self.assertAlmostEqual(self.task.distance_estimated, 302, delta=5)
+        self.assertAlmostEqual(
+            self.task.planned_hours, self.task.distance_estimated / 100
+        )
+        # Not positive speed uses the default one
+        ICP.set_param("tms.route_average_speed", "0")
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            post.return_value = mock.Mock(status_code=500)
+            self.task.get_route_info()
+        self.assertAlmostEqual(
+            self.task.planned_hours, self.task.distance_estimated / 70
+        )
+        # Tractor model circuity factor and speed are used if set
+        self.vehicle_model.write({"circuity_factor": 1.5, "average_speed": 50})
+        self.task.tractor_id = self.vehicle
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            post.return_value = mock.Mock(status_code=500)
+            self.task.get_route_info()
+        self.assertAlmostEqual(self.task.distance_estimated, 453, delta=8)
+        self.assertAlmostEqual(
+            self.task.planned_hours, self.task.distance_estimated / 50
+        )
+        ICP.set_param("tms.route_offline_fallback", False)
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            post.return_value = mock.Mock(status_code=500)
+            self.task.get_route_info()
+        self.assertEqual(self.task.distance_estimated, 0.0)
+
+    def test_route_greatcircle_provider(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "base_geolocalize.georoute_provider",
+            self.env.ref("tms.geoprovider_greatcircle").id,
+        )
+        with mock.patch(GET_SESSION) as get_session:
+            self.task.get_route_info()
+            get_session.return_value.request.assert_not_called()
+        self.assertTrue(self.task.distance_estimated)
+
+    def test_route_parse_malformed_response(self):
+        Router = self.env["tms.router"]
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {}
+        for parse in (
+            Router._parse_googlemap_matrix,
+            Router._parse_openrouteservice_matrix,
+        ):
+            self.assertIsNone(Router._parse_response("test", parse, response))
+
+    def test_route_pool_order(self):
+        def call(i):
+            time.sleep(0.01 * (5 - i))
+            return i
+
+        calls = [lambda i=i: call(i) for i in range(5)]
+        self.assertEqual(run_concurrently(calls, max_workers=5), list(range(5)))
+        self.assertEqual(run_concurrently(calls), list(range(5)))
+
+    def test_route_pool_exceptions(self):
+        def fail():
+            raise ValueError("Provider error")
+
+        results = run_concurrently([lambda: 1, fail, lambda: 3], max_workers=3)
+        self.assertEqual(results[0], 1)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], 3)
+
+    def test_route_pool_rate_limit(self):
+        limiter = RateLimiter(20)
+        start = time.monotonic()
+        run_concurrently([lambda: None] * 5, max_workers=5, rate_limiter=limiter)
+        # Calls are started 0.05 seconds apart
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        limiter = get_rate_limiter("test_provider", 20)
+        self.assertIs(get_rate_limiter("test_provider", 20), limiter)
+        self.assertIsNot(get_rate_limiter("test_provider", 10), limiter)
+
+    def test_route_http_retry_circuit_breaker(self):
+        self.addCleanup(route_http._breakers.clear)
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("tms.route_max_retries", "2")
+        ICP.set_param("tms.route_retry_backoff", "0")
+        ICP.set_param("tms.route_failure_threshold", "1")
+        ICP.set_param("tms.route_offline_fallback", "True")
+        with mock.patch(GET_SESSION) as get_session:
+            post = get_session.return_value.request
+            post.return_value = mock.Mock(status_code=429, headers={})
+            self.task.get_route_info()
+            # First request and two retries
+            self.assertEqual(post.call_count, 3)
+            # Circuit is open, fallback is used without calling provider
+            self.task.get_route_info()
+            self.assertEqual(post.call_count, 3)
+        self.assertTrue(self.task.distance_estimated)
+
+    def test_optimize_route(self):
+        # Points on a line visited in a zigzag order
+        positions = [0, 4, 1, 3, 2, 5]
+        matrix = [[abs(a - b) for b in positions] for a in positions]
+        # Node 3 (position 3) must be visited before node 2 (position 1)
+        route = optimize_route(matrix, [(3, 2)], fix_end=True)
+        self.assertEqual(route[0], 0)
+        self.assertEqual(route[-1], 5)
+        self.assertLess(route.index(3), route.index(2))
+        self.assertLess(
+            sum(matrix[a][b] for a, b in zip(route, route[1:])),
+            sum(matrix[a][a + 1] for a in range(5)),
+        )
+
+    def test_optimize_checkpoints(self):
+        places = self.env["res.partner"].create(
+            [
+                {
+                    "name": "Place %s" % i,
+                    "is_shipping_place": True,
+                    "partner_latitude": 39.0 + lat,
+                    "partner_longitude": -1.0,
+                }
+                for i, lat in enumerate([0, 3, 1, 2])
+            ]
+        )
+        task = self.env["project.task"].create(
+            {
+                "name": "Multi-drop task",
+                "project_id": self.project.id,
+                "checkpoint_ids": [
+                    (0, 0, {"place_id": place.id, "sequence": i})
+                    for i, place in enumerate(places)
+                ],
+            }
+        )
+        task.optimize_checkpoints()
+        checkpoints = task.checkpoint_ids.sorted(lambda c: (c.sequence, c.id))
+        self.assertEqual(
+            checkpoints.mapped("place_id").ids,
+            [places[0].id, places[2].id, places[1].id, places[3].id],
+        )
+
+    def test_optimize_checkpoints_kept_by_fill(self):
+        places = self.env["res.partner"].create(
+            [
+                {
+                    "name": "Place %s" % i,
+                    "is_shipping_place": True,
+                    "partner_latitude": lat,
+                    "partner_longitude": -1.0,
+                }
+                for i, lat in enumerate([39.0, 42.0, 43.0, 40.0])
+            ]
+        )
+        packages = self.env["tms.package"].create(
+            [
+                {
+                    "shipping_origin_id": origin.id,
+                    "shipping_destination_id": destination.id,
+                    "pickup_date": fields.Datetime.now(),
+                }
+                for origin, destination in (
+                    (places[0], places[3]),
+                    (places[1], places[2]),
+                )
+            ]
+        )
+        task = self.env["project.task"].create(
+            {
+                "name": "Multi-drop task",
+                "project_id": self.project.id,
+                "tms_package_ids": [(6, 0, packages.ids)],
+            }
+        )
+        task.fill_checkpoints()
+        self.assertEqual(
+            task.checkpoint_ids.mapped("place_id").ids,
+            [places[i].id for i in (0, 1, 3, 2)],
+        )
+        task.optimize_checkpoints()
+        optimized = task.checkpoint_ids.sorted(lambda c: (c.sequence, c.id))
+        self.assertEqual(
+            optimized.mapped("place_id").ids, [places[i].id for i in (0, 3, 1, 2)]
+        )
+        # Filling again keeps the optimized order
+        self.assertFalse(task.fill_checkpoints())
+        self.assertEqual(
+            task.checkpoint_ids.sorted(lambda c: (c.sequence, c.id)).ids, optimized.ids
+        )
+
+    def test_route_job_queue(self):
+        Job = self.env["tms.route.job"]
+        self.env["ir.config_parameter"].sudo().set_param(
+            "base_geolocalize.georoute_provider",
+            self.env.ref("tms.geoprovider_greatcircle").id,
+        )
+        job = Job.search([("task_id", "=", self.task.id), ("state", "=", "pending")])
+        self.assertEqual(len(job), 1)
+        self.assertTrue(job.fill_checkpoints)
+        # Enqueue again is merged with pending job
+        self.assertEqual(Job.enqueue(self.task, priority=5), job)
+        self.assertEqual(job.priority, 5)
+        self.assertTrue(job.fill_checkpoints)
+        # Changes while job is running enqueue a new pending job
+        self.assertIn(job, Job._start_pending_jobs(10))
+        self.assertEqual(job.state, "started")
+        new_job = Job.enqueue(self.task, fill_checkpoints=True)
+        self.assertNotEqual(new_job, job)
+        self.assertEqual(new_job.state, "pending")
+        job._process()
+        self.assertEqual(new_job.state, "pending")
+        Job._process_jobs()
+        self.assertEqual(new_job.state, "done")
+        self.assertEqual(job.state, "done")
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(self.task.distance_estimated)
+        # Moving a place enqueues its tasks
+        self.partner_destination.partner_latitude = 40.6
+        job2 = Job.search([("task_id", "=", self.task.id), ("state", "=", "pending")])
+        self.assertTrue(job2)
+        self.assertFalse(job2.fill_checkpoints)
+
+
+@tagged("-standard", "tms_route_benchmark")
+class TestTMSRouteBenchmark(TestTMS):
+    """Timing tests not run by default, run them with
+    --test-tags tms_route_benchmark
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ICP = cls.env["ir.config_parameter"].sudo()
+        ICP.set_param("base_geolocalize.google_map_api_key", False)
+        ICP.set_param("base_geolocalize.openrouteservice_api_key", "test-key")
+
+    def test_route_standin_benchmark(self):
+        """Route tasks against local openrouteservice stand-in"""
+        server = RouteStandInServer(latency=0.01).start()
+        self.addCleanup(server.stop)
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("tms.openrouteservice_url", server.url)
+        ICP.set_param("tms.route_max_workers", "4")
+        ICP.set_param("tms.openrouteservice_max_locations", "4")
+        places = self.env["res.partner"].create(
+            [
+                {
+                    "name": "Place %s" % i,
+                    "is_shipping_place": True,
+                    "partner_latitude": 39.0 + i * 0.1,
+                    "partner_longitude": -1.0 + i * 0.1,
+                }
+                for i in range(10)
+            ]
+        )
+        tasks = self.env["project.task"].create(
+            [
+                {
+                    "name": "Benchmark task %s" % i,
+                    "project_id": self.project.id,
+                    "checkpoint_ids": [
+                        (0, 0, {"place_id": places[i % 10].id, "sequence": 1}),
+                        (0, 0, {"place_id": places[(i + 3) % 10].id, "sequence": 2}),
+                        (0, 0, {"place_id": places[(i + 7) % 10].id, "sequence": 3}),
+                    ],
+                }
+                for i in range(50)
+            ]
+        )
+        start = time.time()
+        tasks.get_route_info()
+        elapsed = time.time() - start
+        _logger.info(
+            "Routed %s tasks with %s requests in %.3f seconds",
+            len(tasks),
+            server.requests_count,
+            elapsed,
+        )
+        self.assertTrue(all(tasks.mapped("distance_estimated")))
+        self.assertLess(server.requests_count, len(tasks))
@@ -0,0 +1,6 @@
+from . import route_geo
+from . import route_http
+from . import route_optimizer
+from . import route_pool
+from . import vehicle_assignment
+from . import vehicle_availability
@@ -0,0 +1,145 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""HTTP layer shared by route providers.
+
+Each Odoo worker process keeps a pooled session with keep-alive connections.
+Requests have explicit timeouts, are retried with exponential backoff and
+jitter on HTTP 429, 5xx and connection errors, and a circuit breaker by
+provider stops calling a provider after repeated failures so callers can
+switch to a fallback provider.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+POOL_SIZE = 20
+
+
+class CircuitOpenError(Exception):
+    """Provider is not called because it has failed repeatedly"""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half open: let next request check if provider is back
+                self.opened_at = None
+                self.failures = self.threshold - 1
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.threshold and self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def get_session():
+    """Session shared by all threads of current process"""
+    global _session, _session_pid
+    with _session_lock:
+        # Do not share connections with forked workers
+        if _session is None or _session_pid != os.getpid():
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session_pid = os.getpid()
+        return _session
+
+
+def get_circuit_breaker(provider, threshold, cooldown):
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(threshold, cooldown)
+        breaker.threshold = threshold
+        breaker.cooldown = cooldown
+        return breaker
+
+
+def _retry_delay(response, attempt, backoff):
+    delay = backoff * 2**attempt
+    retry_after = response is not None and response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, float(retry_after))
+    return delay + random.uniform(0, delay)
+
+
+def route_request(
+    provider,
+    method,
+    url,
+    connect_timeout=5.0,
+    read_timeout=30.0,
+    max_retries=3,
+    backoff=0.5,
+    failure_threshold=5,
+    cooldown=60.0,
+    **kwargs
+):
+    """Send a request to a route provider
+    :return: last response received, also when it is an error response
+    :raise CircuitOpenError: provider has failed repeatedly
+    :raise requests.RequestException: connection error after all retries
+    """
+    breaker = get_circuit_breaker(provider, failure_threshold, cooldown)
+    if not breaker.allow():
+        raise CircuitOpenError("Route provider %s is not available" % provider)
+    attempt = 0
+    while True:
+        error = response = None
+        try:
+            response = get_session().request(
+                method, url, timeout=(connect_timeout, read_timeout), **kwargs
+            )
+        except (requests.ConnectionError, requests.Timeout) as err:
+            error = err
+        if response is not None and not (
+            response.status_code == 429 or response.status_code >= 500
+        ):
+            breaker.record_success()
+            return response
+        if attempt >= max_retries:
+            breaker.record_failure()
+            if error is not None:
+                raise error
+            return response
+        delay = _retry_delay(response, attempt, backoff)
+        _logger.info(
+            "Request to %s failed (%s), retrying in %.1f seconds",
+            provider,
+            error or response.status_code,
+            delay,
+        )
+        time.sleep(delay)
+        attempt += 1
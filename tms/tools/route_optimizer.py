@@ -0,0 +1,153 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""Visiting order heuristic for multi-drop routes with precedence constraints.
+
+An initial route is built with nearest neighbour and improved with 2-opt and
+or-opt moves that keep every precedence (pickup before delivery). The route
+starts at node 0 and may keep the last node fixed.
+"""
+import time
+
+
+def _route_cost(route, matrix):
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+def _is_feasible(route, preds):
+    position = {node: i for i, node in enumerate(route)}
+    return all(
+        position[pred] < position[node]
+        for node in route
+        for pred in preds[node]
+        if pred in position
+    )
+
+
+def _nearest_neighbour(matrix, preds, start, end):
+    route = [start]
+    visited = {start}
+    pending = set(range(len(matrix))) - {start, end}
+    while pending:
+        current = route[-1]
+        feasible = [node for node in pending if preds[node] <= visited]
+        # Circular precedences can not be satisfied, ignore them
+        node = min(feasible or pending, key=lambda n: (matrix[current][n], n))
+        route.append(node)
+        visited.add(node)
+        pending.remove(node)
+    if end is not None:
+        route.append(end)
+    return route
+
+
+def _two_opt(route, matrix, preds, last, deadline):
+    """Reverse segments route[i:j + 1] while route distance decreases"""
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        # Forward and backward accumulated costs to evaluate reversals in O(1)
+        forward = [0.0]
+        backward = [0.0]
+        for a, b in zip(route, route[1:]):
+            forward.append(forward[-1] + matrix[a][b])
+            backward.append(backward[-1] + matrix[b][a])
+        position = {node: k for k, node in enumerate(route)}
+        for i in range(1, last):
+            for j in range(i + 1, last + 1):
+                prev_node, first, end = route[i - 1], route[i], route[j]
+                delta = (
+                    matrix[prev_node][end]
+                    - matrix[prev_node][first]
+                    + (backward[j] - backward[i])
+                    - (forward[j] - forward[i])
+                )
+                if j + 1 < len(route):
+                    next_node = route[j + 1]
+                    delta += matrix[first][next_node] - matrix[end][next_node]
+                if delta >= -1e-9:
+                    continue
+                # Reversal breaks precedences between nodes in the segment
+                if any(
+                    i <= position[pred] <= j
+                    for node in route[i : j + 1]
+                    for pred in preds[node]
+                    if pred in position
+                ):
+                    continue
+                route[i : j + 1] = reversed(route[i : j + 1])
+                improved = True
+                break
+            if improved:
+                break
+    return route
+
+
+def _or_opt(route, matrix, preds, last, deadline):
+    """Move segments of up to three nodes while route distance decreases"""
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for length in (1, 2, 3):
+            for i in range(1, last - length + 2):
+                first, end = route[i], route[i + length - 1]
+                prev_node = route[i - 1]
+                next_node = route[i + length] if i + length < len(route) else None
+                remove_delta = -matrix[prev_node][first]
+                if next_node is not None:
+                    remove_delta += (
+                        matrix[prev_node][next_node] - matrix[end][next_node]
+                    )
+                rest = route[:i] + route[i + length :]
+                # Insert after rest[k - 1], never after fixed end node
+                for k in range(1, last - length + 2):
+                    if k == i:
+                        continue
+                    before = rest[k - 1]
+                    after = rest[k] if k < len(rest) else None
+                    delta = remove_delta + matrix[before][first]
+                    if after is not None:
+                        delta += matrix[end][after] - matrix[before][after]
+                    if delta >= -1e-9:
+                        continue
+                    candidate = rest[:k] + route[i : i + length] + rest[k:]
+                    if _is_feasible(candidate, preds):
+                        route = candidate
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+    return route
+
+
+def optimize_route(matrix, precedences=(), fix_end=False, max_seconds=0.5):
+    """Visiting order of nodes 0..n-1 starting at node 0
+    :param matrix: n x n distances as list of lists
+    :param precedences: (a, b) pairs with node a visited before node b
+    :param fix_end: keep node n-1 as the last one
+    :param max_seconds: time limit for improvement stage
+    :return: list of nodes
+    """
+    n = len(matrix)
+    if n < 3:
+        return list(range(n))
+    deadline = time.monotonic() + max_seconds
+    preds = [set() for _i in range(n)]
+    for before, after in precedences:
+        if before != after:
+            preds[after].add(before)
+    end = n - 1 if fix_end else None
+    route = _nearest_neighbour(matrix, preds, 0, end)
+    # Last index that can be moved
+    last = n - 2 if fix_end else n - 1
+    initial = list(range(n))
+    initial_feasible = _is_feasible(initial, preds)
+    route = _two_opt(route, matrix, preds, last, deadline)
+    route = _or_opt(route, matrix, preds, last, deadline)
+    if initial_feasible and (
+        not _is_feasible(route, preds)
+        or _route_cost(route, matrix) >= _route_cost(initial, matrix)
+    ):
+        return initial
+    return route
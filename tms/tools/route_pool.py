@@ -0,0 +1,62 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""Bounded concurrent execution of route provider requests.
+
+Functions executed here must not access the ORM, environments and cursors
+are not thread safe. Callers prepare the requests with plain data and parse
+the results back in the main thread.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Space calls so that no more than `rate` calls per second are started"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def get_rate_limiter(provider, rate):
+    """Rate limiter shared by all threads of this worker for a provider"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(provider)
+        if limiter is None or limiter.interval != (1.0 / rate if rate else 0.0):
+            limiter = _rate_limiters[provider] = RateLimiter(rate)
+        return limiter
+
+
+def run_concurrently(calls, max_workers=1, rate_limiter=None):
+    """Execute callables without arguments in a bounded thread pool
+    :return: list with the result of each call in the same order, or the
+             exception raised by the call
+    """
+
+    def execute(call):
+        if rate_limiter:
+            rate_limiter.wait()
+        try:
+            return call()
+        except Exception as err:
+            return err
+
+    if max_workers <= 1 or len(calls) <= 1:
+        return [execute(call) for call in calls]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+        return list(executor.map(execute, calls))
@@ -0,0 +1,141 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""Local stand-in for openrouteservice matrix and directions endpoints.
+
+Distances are great circle distances and durations use a fixed speed, with an
+optional latency added to each response. It allows to benchmark route
+estimation throughput and latency without network access::
+
+    python tms/tools/route_standin.py --port 8089 --latency 0.05
+
+and set the system parameter ``tms.openrouteservice_url`` to
+``http://127.0.0.1:8089``.
+"""
+import argparse
+import json
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _distance_km(point1, point2):
+    """Great circle distance between two [longitude, latitude] points"""
+    lon1, lat1, lon2, lat2 = map(math.radians, (*point1, *point2))
+    a = (
+        math.sin((lat2 - lat1) / 2.0) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class RouteStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if "/matrix/" in self.path:
+            result = self._matrix(body)
+        elif "/directions/" in self.path:
+            result = self._directions(body)
+        else:
+            result = None
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.count_request()
+        content = json.dumps(result or {"error": "Not found"}).encode()
+        self.send_response(200 if result else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _duration(self, distance):
+        return distance / self.server.speed * 3600.0
+
+    def _matrix(self, body):
+        locations = body.get("locations", [])
+        sources = body.get("sources") or range(len(locations))
+        destinations = body.get("destinations") or range(len(locations))
+        distances = [
+            [_distance_km(locations[i], locations[j]) for j in destinations]
+            for i in sources
+        ]
+        return {
+            "distances": distances,
+            "durations": [[self._duration(d) for d in row] for row in distances],
+        }
+
+    def _directions(self, body):
+        coordinates = body.get("coordinates", [])
+        segments = []
+        for point1, point2 in zip(coordinates, coordinates[1:]):
+            distance = _distance_km(point1, point2)
+            segments.append(
+                {"distance": distance, "duration": self._duration(distance)}
+            )
+        route = {"segments": segments}
+        if body.get("geometry"):
+            route["geometry"] = "standin"
+        return {"routes": [route]}
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class RouteStandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, speed=70.0):
+        super().__init__(address, RouteStandInHandler)
+        self.latency = latency
+        self.speed = speed
+        self.verbose = False
+        self.requests_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://%s:%s" % self.server_address[:2]
+
+    def count_request(self):
+        with self._lock:
+            self.requests_count += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each response"
+    )
+    parser.add_argument("--speed", type=float, default=70.0, help="Speed in km/h")
+    args = parser.parse_args()
+    server = RouteStandInServer((args.host, args.port), args.latency, args.speed)
+    server.verbose = True
+    logging.basicConfig(level=logging.INFO)
+    _logger.info("Route stand-in listening on %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""Greedy assignment of transport tasks to tractors.
+
+Tasks are taken by start time, and tasks with fewer compatible tractors go
+first. Each one is assigned to the compatible tractor, free in the task
+window, with the shortest deadhead distance from its last position. The
+tractor position and busy intervals are updated with each assignment.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+import numpy as np
+
+from .route_geo import haversine_km
+
+
+def _is_compatible(task, vehicle):
+    if not task["requirements"] <= vehicle["tags"]:
+        return False
+    for field, value in task["attributes"].items():
+        allowed = vehicle["attributes"].get(field)
+        if value and allowed and value not in allowed:
+            return False
+    return True
+
+
+def _overlaps(intervals, start, end):
+    """Intervals assigned in the run are sorted and do not overlap"""
+    i = bisect_left(intervals, (end,))
+    return i > 0 and intervals[i - 1][1] > start
+
+
+def assign_tasks(tasks, vehicles, index, max_deadhead_km=0.0):
+    """Assign tasks to vehicles
+    :param tasks: list of dicts with id, start, end, requirements (set of tag
+        ids), attributes (dict with field and value), origin and destination
+        ((latitude, longitude) tuples or None)
+    :param vehicles: list of dicts with id, trailer_id, tags (set of tractor
+        and trailer tag ids), attributes (dict with field and set of allowed
+        values, empty allows any) and position ((latitude, longitude) or None)
+    :param index: AvailabilityIndex with busy intervals of tractors and
+        trailers
+    :param max_deadhead_km: maximum distance to the task origin, 0 for any
+    :return: dict with task id as key and vehicle id as value
+    """
+    if not tasks or not vehicles:
+        return {}
+    # Tasks with same requirements share compatible vehicles
+    compatible = {}
+    task_candidates = []
+    for task in tasks:
+        signature = (
+            frozenset(task["requirements"]),
+            tuple(sorted(task["attributes"].items())),
+        )
+        if signature not in compatible:
+            compatible[signature] = [
+                i for i, vehicle in enumerate(vehicles) if _is_compatible(task, vehicle)
+            ]
+        task_candidates.append(compatible[signature])
+    order = sorted(
+        range(len(tasks)),
+        key=lambda t: (tasks[t]["start"], len(task_candidates[t]), tasks[t]["id"]),
+    )
+    latitudes = np.array(
+        [v["position"][0] if v["position"] else np.nan for v in vehicles]
+    )
+    longitudes = np.array(
+        [v["position"][1] if v["position"] else np.nan for v in vehicles]
+    )
+    assigned_intervals = defaultdict(list)
+    loads = [0] * len(vehicles)
+    result = {}
+    for t in order:
+        task = tasks[t]
+        start, end = task["start"], task["end"]
+        candidates = [
+            i
+            for i in task_candidates[t]
+            if not _overlaps(assigned_intervals[vehicles[i]["id"]], start, end)
+            and index.is_free(vehicles[i]["id"], start, end)
+            and (
+                not vehicles[i]["trailer_id"]
+                or (
+                    not _overlaps(
+                        assigned_intervals[vehicles[i]["trailer_id"]], start, end
+                    )
+                    and index.is_free(vehicles[i]["trailer_id"], start, end)
+                )
+            )
+        ]
+        if not candidates:
+            continue
+        if task["origin"]:
+            distances = haversine_km(
+                latitudes[candidates],
+                longitudes[candidates],
+                task["origin"][0],
+                task["origin"][1],
+            )
+            # Vehicles without position only if no other one is near
+            distances = np.where(np.isnan(distances), np.inf, distances)
+        else:
+            distances = np.zeros(len(candidates))
+        best = min(
+            range(len(candidates)),
+            key=lambda c: (distances[c], loads[candidates[c]], candidates[c]),
+        )
+        if max_deadhead_km and max_deadhead_km < distances[best] < np.inf:
+            continue
+        i = candidates[best]
+        vehicle = vehicles[i]
+        result[task["id"]] = vehicle["id"]
+        loads[i] += 1
+        insort(assigned_intervals[vehicle["id"]], (start, end))
+        if vehicle["trailer_id"]:
+            insort(assigned_intervals[vehicle["trailer_id"]], (start, end))
+        if task["destination"]:
+            latitudes[i], longitudes[i] = task["destination"]
+    return result
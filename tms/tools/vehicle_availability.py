@@ -0,0 +1,70 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+"""Busy intervals of vehicles answering time window queries with bisect.
+
+For each vehicle the interval starts and ends are kept in two sorted lists to
+count the intervals overlapping a window, and overlapped intervals are merged
+to find free slots. Intervals are half open, [start, end).
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+
+class AvailabilityIndex:
+    def __init__(self, intervals=()):
+        """:param intervals: iterable of (key, start, end) tuples"""
+        busy = defaultdict(list)
+        for key, start, end in intervals:
+            if start < end:
+                busy[key].append((start, end))
+        self._starts = {}
+        self._ends = {}
+        self._merged_starts = {}
+        self._merged_ends = {}
+        for key, key_intervals in busy.items():
+            key_intervals.sort()
+            self._starts[key] = [start for start, _end in key_intervals]
+            self._ends[key] = sorted(end for _start, end in key_intervals)
+            merged = [list(key_intervals[0])]
+            for start, end in key_intervals[1:]:
+                if start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._merged_starts[key] = [start for start, _end in merged]
+            self._merged_ends[key] = [end for _start, end in merged]
+
+    def count_busy(self, key, start, end):
+        """Number of intervals overlapping [start, end)"""
+        if key not in self._starts:
+            return 0
+        # Intervals started before window end minus the ended before its start
+        return bisect_left(self._starts[key], end) - bisect_right(
+            self._ends[key], start
+        )
+
+    def is_free(self, key, start, end):
+        if key not in self._merged_starts:
+            return True
+        i = bisect_left(self._merged_starts[key], end) - 1
+        return i < 0 or self._merged_ends[key][i] <= start
+
+    def free_between(self, keys, start, end):
+        """Keys without intervals overlapping [start, end)"""
+        return [key for key in keys if self.is_free(key, start, end)]
+
+    def next_free_slot(self, key, after, duration):
+        """First time from `after` free during `duration`"""
+        starts = self._merged_starts.get(key, [])
+        ends = self._merged_ends.get(key, [])
+        time = after
+        # Skip intervals ended before `after`
+        for i in range(bisect_right(ends, after), len(starts)):
+            if starts[i] > time and starts[i] - time >= duration:
+                break
+            time = max(time, ends[i])
+        return time
+
+    def next_free_slots(self, keys, after, duration):
+        """:return: dict with key as key and first free time as value"""
+        return {key: self.next_free_slot(key, after, duration) for key in keys}
@@ -0,0 +1 @@
+from . import tms_package_import
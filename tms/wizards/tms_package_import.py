@@ -0,0 +1,278 @@
+# Copyright 2026 Tecnativa - Carlos Dauden
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl).
+
+import base64
+import csv
+import io
+import logging
+from contextlib import contextmanager
+
+from odoo import _, exceptions, fields, models
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    _logger.debug("Can not import openpyxl, XLSX files can not be imported")
+    openpyxl = None
+
+
+class TmsPackageImport(models.TransientModel):
+    """Import packages from CSV or XLSX files row by row.
+
+    First row contains tms.package field names. Many2one columns are resolved
+    through lookup tables loaded once by file: shipping places by reference or
+    name for origin and destination, partners by reference or name for
+    customer and goods by name. Records are created in chunks and rows that
+    can not be imported are reported in a CSV file.
+    """
+
+    _name = "tms.package.import"
+    _description = "TMS Package Import"
+
+    file = fields.Binary(required=True, attachment=True)
+    filename = fields.Char()
+    chunk_size = fields.Integer(default=1000, required=True)
+    commit_chunks = fields.Boolean(
+        help="Commit after each chunk, so imported packages are kept if the "
+        "import is interrupted.",
+    )
+    state = fields.Selection(
+        [("draft", "Draft"), ("done", "Done")],
+        default="draft",
+    )
+    imported_count = fields.Integer(string="Imported", readonly=True)
+    rejected_count = fields.Integer(string="Rejected", readonly=True)
+    rejected_file = fields.Binary(readonly=True, attachment=False)
+    rejected_filename = fields.Char(readonly=True)
+
+    def _get_field_parsers(self):
+        """Column parsers by field name"""
+        return {
+            "name": str,
+            "customer_ref": str,
+            "carrier_tracking_ref": str,
+            "note": str,
+            "unload_note": str,
+            "pickup_date": self._parse_datetime,
+            "forecast_unload_date": self._parse_datetime,
+            "length": float,
+            "height": float,
+            "wide": float,
+            "shipping_volume": float,
+            "shipping_weight": float,
+            "number_of_packages": self._parse_int,
+            "pallet_qty": self._parse_int,
+            "euro_pallet_qty": self._parse_int,
+            "sequence": self._parse_int,
+        }
+
+    def _get_lookup_domains(self):
+        """Many2one columns resolved with lookup tables
+        :return: dict with field name as key and (lookup table name, model,
+                 domain, key fields) as value
+        """
+        places = (
+            "res.partner",
+            [("is_shipping_place", "=", True)],
+            ["ref", "name"],
+        )
+        return {
+            "shipping_origin_id": ("place",) + places,
+            "shipping_destination_id": ("place",) + places,
+            "partner_id": ("partner", "res.partner", [], ["ref", "name"]),
+            "goods_id": ("goods", "tms.goods", [], ["name"]),
+        }
+
+    def _parse_datetime(self, value):
+        return fields.Datetime.to_datetime(value)
+
+    def _parse_int(self, value):
+        return int(float(value))
+
+    def _build_lookup_table(self, model, domain, key_fields):
+        """Map lowercase keys of each key field to record ids. Ambiguous keys
+        map to None.
+        :return: list of dicts in key fields priority order
+        """
+        tables = [{} for _key_field in key_fields]
+        for values in self.env[model].search_read(domain, key_fields):
+            for table, key_field in zip(tables, key_fields):
+                if not values[key_field]:
+                    continue
+                key = str(values[key_field]).strip().lower()
+                table[key] = values["id"] if key not in table else None
+        return tables
+
+    def _lookup(self, tables, value):
+        key = str(value).strip().lower()
+        for table in tables:
+            if key in table:
+                return table[key]
+        return False
+
+    @contextmanager
+    def _open_file(self):
+        attachment = (
+            self.env["ir.attachment"]
+            .sudo()
+            .search(
+                [
+                    ("res_model", "=", self._name),
+                    ("res_id", "=", self.id),
+                    ("res_field", "=", "file"),
+                ],
+                limit=1,
+            )
+        )
+        if attachment.store_fname:
+            stream = open(attachment._full_path(attachment.store_fname), "rb")
+        else:
+            stream = io.BytesIO(attachment.raw or base64.b64decode(self.file))
+        try:
+            yield stream
+        finally:
+            stream.close()
+
+    def _iter_rows(self, stream):
+        """Yield file rows as dicts without loading the whole file"""
+        if (self.filename or "").lower().endswith(".xlsx"):
+            if openpyxl is None:
+                raise exceptions.UserError(
+                    _("Python library openpyxl is needed to import XLSX files")
+                )
+            workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+            try:
+                rows = workbook.worksheets[0].iter_rows(values_only=True)
+                header = [str(h or "").strip() for h in next(rows, [])]
+                for row in rows:
+                    if any(cell not in (None, "") for cell in row):
+                        yield dict(zip(header, row))
+            finally:
+                workbook.close()
+        else:
+            text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+            try:
+                yield from csv.DictReader(text_stream)
+            finally:
+                text_stream.detach()
+
+    def _prepare_package_vals(self, row, lookups):
+        """Package values from file row
+        :raise ValueError: if a value can not be parsed or found
+        """
+        vals = {"name": "/"}
+        parsers = self._get_field_parsers()
+        lookup_fields = self._get_lookup_domains()
+        for column, value in row.items():
+            if column is None or value in (None, ""):
+                continue
+            if column in parsers:
+                vals[column] = parsers[column](value)
+            elif column in lookup_fields:
+                record_id = self._lookup(lookups[lookup_fields[column][0]], value)
+                if not record_id:
+                    raise ValueError(
+                        (
+                            _("%(field)s %(value)s is ambiguous")
+                            if record_id is None
+                            else _("%(field)s %(value)s not found")
+                        )
+                        % {"field": column, "value": value}
+                    )
+                vals[column] = record_id
+        return vals
+
+    def _create_chunk(self, chunk, rejected):
+        """Create packages of chunk, if it fails rows are created one by one
+        to reject only the wrong ones.
+        :return: number of created packages
+        """
+        Package = self.env["tms.package"]
+        try:
+            with self.env.cr.savepoint():
+                Package.create([vals for _row_number, vals in chunk])
+            return len(chunk)
+        except Exception:
+            _logger.debug("Package import chunk failed, creating row by row")
+        created = 0
+        for row_number, vals in chunk:
+            try:
+                with self.env.cr.savepoint():
+                    Package.create(vals)
+                created += 1
+            except Exception as e:
+                rejected.writerow([row_number, str(e)])
+        return created
+
+    def action_import(self):
+        self.ensure_one()
+        lookups = {}
+        for (
+            table_name,
+            model,
+            domain,
+            key_fields,
+        ) in self._get_lookup_domains().values():
+            if table_name not in lookups:
+                lookups[table_name] = self._build_lookup_table(
+                    model, domain, key_fields
+                )
+        rejected_stream = io.StringIO()
+        rejected = csv.writer(rejected_stream)
+        rejected.writerow([_("Row"), _("Error")])
+        imported = rejected_count = 0
+        chunk = []
+        with self._open_file() as stream:
+            # Header is the first row
+            for row_number, row in enumerate(self._iter_rows(stream), start=2):
+                try:
+                    chunk.append((row_number, self._prepare_package_vals(row, lookups)))
+                except (ValueError, TypeError) as e:
+                    rejected.writerow([row_number, str(e)])
+                    rejected_count += 1
+                if len(chunk) >= self.chunk_size:
+                    created = self._create_chunk(chunk, rejected)
+                    imported += created
+                    rejected_count += len(chunk) - created
+                    chunk = []
+                    self._commit_progress(imported, rejected_count)
+            if chunk:
+                created = self._create_chunk(chunk, rejected)
+                imported += created
+                rejected_count += len(chunk) - created
+        vals = {
+            "state": "done",
+            "imported_count": imported,
+            "rejected_count": rejected_count,
+        }
+        if rejected_count:
+            vals.update(
+                {
+                    "rejected_file": base64.b64encode(
+                        rejected_stream.getvalue().encode()
+                    ),
+                    "rejected_filename": "rejected_%s.csv"
+                    % (self.filename or "packages").rsplit(".", 1)[0],
+                }
+            )
+        self.write(vals)
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+    def _commit_progress(self, imported, rejected_count):
+        _logger.info(
+            "Package import %s: %s imported, %s rejected",
+            self.filename,
+            imported,
+            rejected_count,
+        )
+        if self.commit_chunks:
+            self.write({"imported_count": imported, "rejected_count": rejected_count})
+            self.env.cr.commit()  # pylint: disable=invalid-commit
@@ -140,41 +140,140 @@ class SaleOrderLine(models.Model):
     def _compute_shipping_volume(self):
         self.get_field_from_packages_numeric("shipping_volume")
 
-    def _inverse_shipping_volume(self):
-        self.set_field_to_packages("shipping_volume")
-
     @api.depends("tms_package_ids.shipping_weight")
     def _compute_shipping_weight(self):
         self.get_field_from_packages_numeric("shipping_weight")
 
-    def _inverse_shipping_weight(self):
-        self.set_field_to_packages("shipping_weight")
-
     @api.depends("tms_package_ids.number_of_packages")
     def _compute_number_of_packages(self):
         self.get_field_from_packages_numeric("number_of_packages")
 
-    def _inverse_number_of_packages(self):
-        self.set_field_to_packages("number_of_packages")
-
     @api.depends("tms_package_ids.pallet_qty")
     def _compute_pallet_qty(self):
         self.get_field_from_packages_numeric("pallet_qty")
 
-    def _inverse_pallet_qty(self):
-        self.set_field_to_packages("pallet_qty")
-
     @api.depends("tms_package_ids.euro_pallet_qty")
     def _compute_euro_pallet_qty(self):
         self.get_field_from_packages_numeric("euro_pallet_qty")
 
-    def _inverse_euro_pallet_qty(self):
-        self.set_field_to_packages("euro_pallet_qty")
-
     @api.depends("tms_package_ids.carrier_tracking_ref")
     def _compute_carrier_tracking_ref(self):
         self.get_field_from_packages_text("carrier_tracking_ref")
 
+    def get_field_from_packages_text(self, field_name):
+        self._set_package_field_values(field_name)
+
+    def get_field_from_packages_numeric(self, field_name):
+        self._set_package_field_values(field_name)
+
+    @api.model
+    def _get_package_fields(self):
+        """Line fields with sum or join of package fields with same name"""
+        return [
+            "shipping_volume",
+            "shipping_weight",
+            "number_of_packages",
+            "pallet_qty",
+            "euro_pallet_qty",
+            "carrier_tracking_ref",
+        ]
+
+    def _set_package_field_values(self, field_name):
+        """Sum of numeric field or joined text field of packages. All package
+        fields of lines are read with one query and the ones not computed yet
+        are cached, so their computes do not query again.
+        """
+        lines = self.filtered("id")
+        field_names = self._get_package_fields()
+        values_map = lines._get_package_fields_values(field_names)
+        for line in self:
+            if line.id in values_map:
+                line[field_name] = values_map[line.id][field_name]
+            else:
+                line[field_name] = line._get_package_field_value_from_records(
+                    field_name
+                )
+        cache = self.env.cache
+        for name in field_names:
+            field = self._fields[name]
+            for line in lines:
+                if cache.contains(line, field) or self.env.is_protected(field, line):
+                    continue
+                cache.set(
+                    line, field, field.convert_to_cache(values_map[line.id][name], line)
+                )
+
+    def _get_package_fields_values(self, field_names):
+        """Package fields aggregated by line, only readable packages are used
+        :return: dict with line id as key and dict with field name and value
+                 as value
+        """
+        if not self:
+            return {}
+        Package = self.env["tms.package"]
+        text_fields = {
+            name
+            for name in field_names
+            if Package._fields[name].type in ("char", "text")
+        }
+        self.flush(["tms_package_ids"])
+        Package.flush(field_names)
+        query = Package._where_calc([])
+        Package._apply_ir_rules(query, "read")
+        package_query, package_params = query.select('"tms_package"."id"')
+        aggregates = [
+            """string_agg(package.{field}, ', ' ORDER BY package.id DESC)
+                FILTER (WHERE package.{field} != '')""".format(
+                field=name
+            )
+            if name in text_fields
+            else "COALESCE(SUM(package.{field}), 0)".format(field=name)
+            for name in field_names
+        ]
+        self.env.cr.execute(
+            """
+            SELECT rel.sale_order_line_id, {aggregates}
+            FROM sale_order_line_tms_package_rel rel
+            JOIN tms_package package ON package.id = rel.tms_package_id
+            WHERE rel.sale_order_line_id IN %s
+                AND rel.tms_package_id IN ({package_query})
+            GROUP BY rel.sale_order_line_id
+            """.format(
+                aggregates=", ".join(aggregates),
+                package_query=package_query,
+            ),
+            [tuple(self.ids)] + list(package_params),
+        )
+        empty_values = {name: "" if name in text_fields else 0 for name in field_names}
+        values_map = {line_id: dict(empty_values) for line_id in self.ids}
+        for row in self.env.cr.fetchall():
+            for name, value in zip(field_names, row[1:]):
+                values_map[row[0]][name] = value or empty_values[name]
+        return values_map
+
+    def _get_package_field_value_from_records(self, field_name):
+        """Package field value of new lines"""
+        self.ensure_one()
+        values = self.tms_package_ids.mapped(field_name)
+        if self.tms_package_ids._fields[field_name].type in ("char", "text"):
+            return ", ".join(value for value in values if value)
+        return sum(values)
+
+    def _inverse_shipping_volume(self):
+        self.set_field_to_packages("shipping_volume")
+
+    def _inverse_shipping_weight(self):
+        self.set_field_to_packages("shipping_weight")
+
+    def _inverse_number_of_packages(self):
+        self.set_field_to_packages("number_of_packages")
+
+    def _inverse_pallet_qty(self):
+        self.set_field_to_packages("pallet_qty")
+
+    def _inverse_euro_pallet_qty(self):
+        self.set_field_to_packages("euro_pallet_qty")
+
     def _inverse_carrier_tracking_ref(self):
         self.set_field_to_packages("carrier_tracking_ref")
 
@@ -183,18 +282,6 @@ class SaleOrderLine(models.Model):
         for line in self:
             line.editable_package_rel = not len(line.tms_package_ids) > 1
 
-    def get_field_from_packages_text(self, field_name):
-        for line in self:
-            ref_list = []
-            for package in line.tms_package_ids:
-                if package[field_name]:
-                    ref_list.append(package[field_name])
-            line[field_name] = ", ".join(ref_list)
-
-    def get_field_from_packages_numeric(self, field_name):
-        for line in self:
-            line[field_name] = sum(line.tms_package_ids.mapped(field_name))
-
     def set_field_to_packages(self, field_name):
         for line in self:
             if not line[field_name]:
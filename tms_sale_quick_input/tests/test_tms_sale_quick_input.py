@@ -110,3 +110,74 @@ class TestTmsSaleQuickInput(common.TransactionCase):
             sale_order_line.tms_package_ids.shipping_origin_id,
             sale_order_line.shipping_origin_id,
         )
+
+    def test_05_package_fields_batch(self):
+        package_2 = self.package_1.copy(
+            {"name": "Package 2", "carrier_tracking_ref": "Reference 2"}
+        )
+        order = self.env["sale.order"].create(
+            {
+                "partner_id": self.partner.id,
+                "order_line": [
+                    (
+                        0,
+                        0,
+                        {
+                            "product_id": self.product.id,
+                            "tms_package_ids": [(6, 0, packages.ids)],
+                        },
+                    )
+                    for packages in (self.package_1 | package_2, package_2)
+                ],
+            }
+        )
+        line_1, line_2 = order.order_line
+        order.order_line.invalidate_cache()
+        # All package fields of all lines are read with one query
+        with self.assertQueryCount(1):
+            for field_name in self.env["sale.order.line"]._get_package_fields():
+                order.order_line.mapped(field_name)
+        self.assertEqual(line_1.shipping_volume, 20)
+        self.assertEqual(line_1.pallet_qty, 2)
+        self.assertEqual(line_1.carrier_tracking_ref, "Reference 2, Reference")
+        self.assertEqual(line_2.shipping_weight, 20)
+        self.assertEqual(line_2.carrier_tracking_ref, "Reference 2")
+
+    def test_06_write_one_package_field(self):
+        package_2 = self.package_1.copy({"name": "Package 2"})
+        order = self.env["sale.order"].create(
+            {
+                "partner_id": self.partner.id,
+                "order_line": [
+                    (
+                        0,
+                        0,
+                        {
+                            "product_id": self.product.id,
+                            "tms_package_ids": [(6, 0, self.package_1.ids)],
+                            "shipping_weight": 50,
+                        },
+                    )
+                ],
+            }
+        )
+        line = order.order_line
+        line.write({"tms_package_ids": [(6, 0, package_2.ids)], "pallet_qty": 3})
+        for package, weight, pallet_qty in (
+            (self.package_1, 50, 1),
+            (package_2, 20, 3),
+        ):
+            self.assertEqual(package.shipping_weight, weight)
+            self.assertEqual(package.pallet_qty, pallet_qty)
+            self.assertEqual(package.shipping_volume, 10)
+            self.assertEqual(package.number_of_packages, 2)
+            self.assertEqual(package.euro_pallet_qty, 1)
+            self.assertEqual(package.carrier_tracking_ref, "Reference")
+        line.invalidate_cache()
+        with self.assertQueryCount(1):
+            for field_name in self.env["sale.order.line"]._get_package_fields():
+                line[field_name]
+        self.assertEqual(line.shipping_weight, 20)
+        self.assertEqual(line.pallet_qty, 3)
+        self.assertEqual(line.shipping_volume, 10)
+        self.assertEqual(line.carrier_tracking_ref, "Reference")